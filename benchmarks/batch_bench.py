@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           batch_bench.py
+#   description:    Benchmark comparing one cpl0.py process per file with the
+#                   batch mode compiling all files in one run
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          python3 benchmarks/batch_bench.py [--files N] [--jobs N [N ...]]
+#
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CPL0 = os.path.join(ROOT, "cpl0.py")
+
+# Sample of files compiled by separate processes, the time per file of
+# this mode hardly depends on the number of files
+SERIAL_SAMPLE = 20
+
+
+def run(arguments):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, CPL0] + arguments, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='PL0 Batch Compile Benchmark')
+    parser.add_argument("--files", "-f", help="number of source files", type=int, default=2000)
+    parser.add_argument("--jobs", "-j", help="worker processes of the batch runs", type=int, nargs="+",
+        default=sorted({1, os.cpu_count()}))
+    args = parser.parse_args()
+
+    examples = os.path.join(ROOT, "examples")
+    programs = [os.path.join(examples, f) for f in sorted(os.listdir(examples)) if f.endswith(".pl0") and f != "abgabe.pl0"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = []
+        for i in range(args.files):
+            files.append(os.path.join(directory, "p{}.pl0".format(i)))
+            shutil.copy(programs[i % len(programs)], files[-1])
+
+        print("{:24} {:>10} {:>12}".format("mode", "time s", "files/sec"))
+
+        sample = files[:SERIAL_SAMPLE]
+        duration = sum(run([f]) for f in sample) / len(sample) * len(files)
+        print("{:24} {:10.2f} {:12.0f}".format("process per file (est.)", duration, len(files) / duration))
+
+        for jobs in args.jobs:
+            duration = run(["--jobs", str(jobs), directory])
+            print("{:24} {:10.2f} {:12.0f}".format("batch, {} job(s)".format(jobs), duration, len(files) / duration))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           codegen_bench.py
+#   description:    Benchmark measuring the instructions/sec the code
+#                   generator emits and lowers for a typical mix of commands
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          python3 benchmarks/codegen_bench.py [--statements N] [--repeat N]
+#
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pl0codegen import PL0CodeGen, VMCode, lowerInstructions
+
+# Commands of the statements "X := X + Y * 3; IF X > -P THEN ! X; ! "...""
+# with X local, Y global and P a procedure parameter
+STATEMENT = [
+    (VMCode.PUSH_ADDRESS_VAR_LOCAL, [0]),
+    (VMCode.PUSH_VALUE_VAR_LOCAL, [0]),
+    (VMCode.PUSH_VALUE_VAR_GLOBAL, [4, 1]),
+    (VMCode.PUSH_CONST, [0]),
+    (VMCode.OP_MULT, []),
+    (VMCode.OP_ADD, []),
+    (VMCode.STORE_VAL, []),
+    (VMCode.PUSH_VALUE_VAR_LOCAL, [0]),
+    (VMCode.PUSH_VALUE_VAR_LOCAL, [-16]),
+    (VMCode.VZ_MINUS, []),
+    (VMCode.CMP_GT, []),
+    (VMCode.JMP_NOT, [4]),
+    (VMCode.PUSH_VALUE_VAR_LOCAL, [0]),
+    (VMCode.PUSH_VAL, []),
+]
+STRING = "The result is"
+
+
+def emit(statements):
+    codeGen = PL0CodeGen()
+    for _ in range(statements):
+        for vmcode, args in STATEMENT:
+            codeGen.writeCommand(vmcode, args)
+        codeGen.putString(STRING)
+    return lowerInstructions(codeGen.instructions)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='PL0 Code Generator Benchmark')
+    parser.add_argument("--statements", "-s", help="number of emitted statements", type=int, default=20000)
+    parser.add_argument("--repeat", "-r", help="runs, the best one counts", type=int, default=5)
+    args = parser.parse_args()
+
+    instructions = args.statements * (len(STATEMENT) + 1)
+
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        code = emit(args.statements)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+
+    print("{:8} instructions {:8} bytes {:8.3f}s {:12.0f} instructions/sec".format(
+        instructions, len(code), best, instructions / best))
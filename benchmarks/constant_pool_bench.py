@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           constant_pool_bench.py
+#   description:    Benchmark showing how the constant pool scales with the
+#                   number of distinct numeric literals, once for the
+#                   lookups of the namelist alone and once for compiling a
+#                   program using all of them
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          python3 benchmarks/constant_pool_bench.py [--sizes N [N ...]]
+#
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pl0namelist import PL0NameList
+from pl0compiler import compile
+
+# PUSH_CONST takes the index of the constant as 2 byte argument, so
+# larger programs are only measured at the namelist level
+MAX_CONSTANTS = 65536
+
+STATEMENTS_PER_PROCEDURE = 1000
+
+
+def generateSource(literals):
+    lines = ["VAR X;"]
+    procedures = 0
+    while procedures * STATEMENTS_PER_PROCEDURE < literals:
+        first = procedures * STATEMENTS_PER_PROCEDURE
+        last = min(first + STATEMENTS_PER_PROCEDURE, literals)
+        lines.append("PROCEDURE P{};".format(procedures))
+        lines.append("BEGIN")
+        lines.append(";\n".join("  X := {}".format(100000 + i) for i in range(first, last)))
+        lines.append("END;")
+        procedures += 1
+
+    lines.append("BEGIN")
+    lines.append(";\n".join("  CALL P{}".format(i) for i in range(procedures)))
+    lines.append("END.")
+    return "\n".join(lines) + "\n"
+
+
+# Does what factorPushNumber does for every literal: look the value up
+# and add it to the pool if it's new, every value gets used twice
+def fillPool(literals):
+    nameList = PL0NameList()
+    for value in list(range(literals)) * 2:
+        if nameList.searchConstByValue(value) is None:
+            nameList.createConst(value)
+    return nameList
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='PL0 Constant Pool Benchmark')
+    parser.add_argument("--sizes", "-s", help="numbers of distinct literals", type=int, nargs="+",
+        default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print("{:>10} {:>12} {:>16} {:>12} {:>16}".format("literals", "pool s", "pool us/literal", "compile s", "compile us/literal"))
+
+    for literals in args.sizes:
+        start = time.perf_counter()
+        nameList = fillPool(literals)
+        pool = time.perf_counter() - start
+        assert len(nameList.constantList) == literals
+
+        if literals <= MAX_CONSTANTS:
+            source = generateSource(literals)
+            start = time.perf_counter()
+            compile(source)
+            duration = time.perf_counter() - start
+            compileTime = "{:12.2f} {:16.1f}".format(duration, duration / literals * 1e6)
+        else:
+            compileTime = "{:>12} {:>16}".format("-", "-")
+
+        print("{:10} {:12.3f} {:16.2f} {}".format(literals, pool, pool / literals * 1e6, compileTime))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           lexer_bench.py
+#   description:    Micro-benchmark measuring tokens/sec of the lexer backends
+#                   on identifier-heavy input
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          python3 benchmarks/lexer_bench.py [--statements N] [--repeat N]
+#
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pl0lexer import LEXER_BACKENDS, MorphemCode
+
+# Most identifiers start with a keyword letter, so they all go through
+# the keyword lookup of state 9.
+IDENTIFIERS = ["ALPHA", "BETA", "COUNTER", "DELTA", "ELEMENT", "FACTOR", "INDEX",
+               "NUMBER", "OFFSET", "POSITION", "RESULT", "TOTAL", "VALUE", "WIDTH", "XSUM"]
+
+
+def generateSource(statements):
+    lines = ["VAR " + ", ".join(IDENTIFIERS) + ";", "BEGIN"]
+    for i in range(statements):
+        target = IDENTIFIERS[i % len(IDENTIFIERS)]
+        left = IDENTIFIERS[(i + 3) % len(IDENTIFIERS)]
+        right = IDENTIFIERS[(i + 7) % len(IDENTIFIERS)]
+        lines.append("  {} := {} + {} * {};".format(target, left, right, target))
+    lines.append("  ! RESULT")
+    lines.append("END.")
+    return "\n".join(lines) + "\n"
+
+
+def lexAll(lexerClass, inputFile):
+    lexer = lexerClass(inputFile)
+    tokens = 0
+    while lexer.lex().code != MorphemCode.EMPTY:
+        tokens += 1
+    return tokens
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='PL0 Lexer Benchmark')
+    parser.add_argument("--statements", "-s", help="number of generated statements", type=int, default=20000)
+    parser.add_argument("--repeat", "-r", help="runs per backend, the best one counts", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        inputFile = os.path.join(directory, "identifiers.pl0")
+        with open(inputFile, "w") as f:
+            f.write(generateSource(args.statements))
+
+        for name, lexerClass in sorted(LEXER_BACKENDS.items()):
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                tokens = lexAll(lexerClass, inputFile)
+                duration = time.perf_counter() - start
+                best = duration if best is None else min(best, duration)
+
+            print("{:10} {:8} tokens {:8.3f}s {:12.0f} tokens/sec".format(name, tokens, best, tokens / best))
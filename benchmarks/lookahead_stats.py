@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           lookahead_stats.py
+#   description:    Counts the subgraph descents of the parser and the ones
+#                   avoided by the FIRST set lookahead for every program of
+#                   the examples folder
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          python3 benchmarks/lookahead_stats.py [folder]
+#
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pl0parser import PL0Parser
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='PL0 Parser Lookahead Statistics')
+    parser.add_argument("folder", nargs="?", help="folder with PL/0 programs",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples"))
+    args = parser.parse_args()
+
+    inputFiles = [os.path.abspath(os.path.join(args.folder, f)) for f in sorted(os.listdir(args.folder)) if f.endswith(".pl0")]
+
+    with tempfile.TemporaryDirectory() as directory:
+        outputFile = os.path.join(directory, "out.cl0")
+
+        print("{:24} {:>10} {:>10} {:>9}".format("file", "descents", "avoided", "avoided %"))
+
+        totalDescents = 0
+        totalSkipped = 0
+        for inputFile in inputFiles:
+            p = PL0Parser(inputFile, outputFile, buildTree=False)
+            if not p.parse():
+                print("{:24} failed".format(os.path.basename(inputFile)))
+                continue
+
+            attempts = p.subgraphDescents + p.subgraphsSkipped
+            totalDescents += p.subgraphDescents
+            totalSkipped += p.subgraphsSkipped
+            print("{:24} {:10} {:10} {:8.1f}%".format(
+                os.path.basename(inputFile), p.subgraphDescents, p.subgraphsSkipped, 100 * p.subgraphsSkipped / attempts))
+
+        print("{:24} {:10} {:10} {:8.1f}%".format(
+            "total", totalDescents, totalSkipped, 100 * totalSkipped / (totalDescents + totalSkipped)))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           namelist_memory_bench.py
+#   description:    Benchmark measuring the memory of the namelist for
+#                   programs with many declarations, once for the namelist
+#                   alone and once as peak of the whole compilation
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          python3 benchmarks/namelist_memory_bench.py [--declarations N]
+#
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pl0namelist import PL0NameList
+from pl0compiler import compile
+
+# Each procedure declares constants and variables, the constant values
+# are distinct, so every named constant also adds one to the pool
+CONSTANTS_PER_PROCEDURE = 50
+VARIABLES_PER_PROCEDURE = 49
+
+
+def procedureCount(declarations):
+    return max(1, declarations // (CONSTANTS_PER_PROCEDURE + VARIABLES_PER_PROCEDURE + 1))
+
+
+def generateSource(declarations):
+    lines = []
+    for p in range(procedureCount(declarations)):
+        lines.append("PROCEDURE P{};".format(p))
+        lines.append("CONST " + ", ".join("C{} = {}".format(i, p * CONSTANTS_PER_PROCEDURE + i) for i in range(CONSTANTS_PER_PROCEDURE)) + ";")
+        lines.append("VAR " + ", ".join("V{}".format(i) for i in range(VARIABLES_PER_PROCEDURE)) + ";")
+        lines.append("V0 := C0;")
+    lines.append("! 1.")
+    return "\n".join(lines) + "\n"
+
+
+# Declares the same idents as generateSource() directly in a namelist
+def declare(declarations):
+    nameList = PL0NameList()
+    for p in range(procedureCount(declarations)):
+        nameList.createProc("P{}".format(p))
+        for i in range(CONSTANTS_PER_PROCEDURE):
+            nameList.createConst(p * CONSTANTS_PER_PROCEDURE + i, "C{}".format(i))
+        for i in range(VARIABLES_PER_PROCEDURE):
+            nameList.createVar("V{}".format(i))
+        nameList.endProc()
+    return nameList
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='PL0 Namelist Memory Benchmark')
+    parser.add_argument("--declarations", "-d", help="number of declarations", type=int, default=100000)
+    args = parser.parse_args()
+
+    source = generateSource(args.declarations)
+
+    # Strings of the names are allocated before measuring, so only the
+    # namelist structures count
+    tracemalloc.start()
+    nameList = declare(args.declarations)
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del nameList
+
+    tracemalloc.start()
+    compile(source)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print("{:>12} {:>14} {:>18} {:>16}".format("declarations", "namelist KiB", "bytes/declaration", "compile peak KiB"))
+    print("{:12} {:14.1f} {:18.1f} {:16.1f}".format(args.declarations, retained / 1024, retained / args.declarations, peak / 1024))
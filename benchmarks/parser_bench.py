@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           parser_bench.py
+#   description:    Benchmark measuring the time to create a parser and
+#                   compile every program of the examples folder, with and
+#                   without building the parse tree
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          python3 benchmarks/parser_bench.py [--repeat N] [folder]
+#
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pl0parser import PL0Parser
+
+
+def compileFile(inputFile, outputFile, buildTree):
+    parser = PL0Parser(inputFile, outputFile, buildTree=buildTree)
+    return parser.parse()
+
+
+def bestTime(inputFile, outputFile, buildTree, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if not compileFile(inputFile, outputFile, buildTree):
+            return None
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='PL0 Parser Benchmark')
+    parser.add_argument("--repeat", "-r", help="runs per file, the best one counts", type=int, default=20)
+    parser.add_argument("folder", nargs="?", help="folder with PL/0 programs",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples"))
+    args = parser.parse_args()
+
+    inputFiles = [os.path.abspath(os.path.join(args.folder, f)) for f in sorted(os.listdir(args.folder)) if f.endswith(".pl0")]
+
+    with tempfile.TemporaryDirectory() as directory:
+        outputFile = os.path.join(directory, "out.cl0")
+
+        print("{:24} {:>12} {:>12}".format("file", "tree", "code only"))
+
+        totalTree = 0
+        totalCodeOnly = 0
+        for inputFile in inputFiles:
+            tree = bestTime(inputFile, outputFile, True, args.repeat)
+            codeOnly = bestTime(inputFile, outputFile, False, args.repeat)
+            if tree is None or codeOnly is None:
+                print("{:24} failed".format(os.path.basename(inputFile)))
+                continue
+
+            totalTree += tree
+            totalCodeOnly += codeOnly
+            print("{:24} {:10.3f}ms {:10.3f}ms".format(os.path.basename(inputFile), tree * 1000, codeOnly * 1000))
+
+        print("{:24} {:10.3f}ms {:10.3f}ms".format("total", totalTree * 1000, totalCodeOnly * 1000))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           parser_scaling_bench.py
+#   description:    Benchmark showing how parse time and peak memory scale
+#                   with the number of statements of synthetic programs
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          python3 benchmarks/parser_scaling_bench.py [--sizes N [N ...]] [--gc]
+#
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pl0parser import PL0Parser
+
+# The code of a procedure is limited to 64 KiB, so the statements
+# are spread over procedures called by the main program
+STATEMENTS_PER_PROCEDURE = 1000
+
+
+def generateSource(statements):
+    lines = ["VAR X;"]
+    procedures = 0
+    while procedures * STATEMENTS_PER_PROCEDURE < statements:
+        count = min(STATEMENTS_PER_PROCEDURE, statements - procedures * STATEMENTS_PER_PROCEDURE)
+        lines.append("PROCEDURE P{};".format(procedures))
+        lines.append("BEGIN")
+        lines.extend(["  X := X + 1;"] * (count - 1))
+        lines.append("  X := X + 1")
+        lines.append("END;")
+        procedures += 1
+
+    lines.append("BEGIN")
+    lines.append(";\n".join("  CALL P{}".format(i) for i in range(procedures)))
+    lines.append("END.")
+    return "\n".join(lines) + "\n"
+
+
+# Like cpl0.py, the cyclic garbage collector is paused while parsing
+# unless keepCollector is set
+def parseFile(inputFile, outputFile, keepCollector=False):
+    if not keepCollector:
+        gc.disable()
+    try:
+        result = PL0Parser(inputFile, outputFile).parse()
+    finally:
+        gc.enable()
+
+    if not result:
+        raise RuntimeError("parsing {} failed".format(inputFile))
+    return result
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='PL0 Parser Scaling Benchmark')
+    parser.add_argument("--sizes", "-s", help="numbers of statements", type=int, nargs="+",
+        default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--gc", help="keep the garbage collector running while parsing", action="store_true")
+    args = parser.parse_args()
+
+    print("{:>10} {:>10} {:>14} {:>12} {:>14}".format("statements", "time s", "us/statement", "peak MiB", "bytes/statement"))
+
+    with tempfile.TemporaryDirectory() as directory:
+        inputFile = os.path.join(directory, "scaling.pl0")
+        outputFile = os.path.join(directory, "scaling.cl0")
+
+        for statements in args.sizes:
+            with open(inputFile, "w") as f:
+                f.write(generateSource(statements))
+
+            # Time and memory are measured in separate runs, because
+            # tracing the allocations slows down the parser
+            start = time.perf_counter()
+            parseFile(inputFile, outputFile, args.gc)
+            duration = time.perf_counter() - start
+
+            tracemalloc.start()
+            result = parseFile(inputFile, outputFile, args.gc)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            del result
+
+            print("{:10} {:10.2f} {:14.1f} {:12.1f} {:14.0f}".format(
+                statements, duration, duration / statements * 1e6, peak / 2**20, peak / statements))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           peephole_report.py
+#   description:    Reports the bytes and instructions -O saves for every
+#                   program of the examples folder, in total and by the
+#                   peephole optimizer alone
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          python3 benchmarks/peephole_report.py [folder]
+#
+
+import argparse
+import logging
+import os
+import struct
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pl0parser import PL0Parser
+from pl0codegen import COMMAND_STRUCTS, VMCode
+
+
+# Counts the instructions of all procedures of a .cl0 image
+def countInstructions(image):
+    count = 0
+    position = 4
+    for _ in range(struct.unpack_from("<H", image)[0]):
+        end = position + struct.unpack_from("<H", image, position + 1)[0]
+        while position < end:
+            if image[position] == VMCode.PUTSTRG.value:
+                position = image.index(0, position + 1) + 1
+            else:
+                position += COMMAND_STRUCTS[image[position]].size
+            count += 1
+    return count
+
+
+def compileFile(inputFile, optimize):
+    p = PL0Parser(inputFile, None, buildTree=False, optimize=optimize)
+    if not p.parse():
+        return None
+    return p
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='PL0 Peephole Optimizer Report')
+    parser.add_argument("folder", nargs="?", help="folder with PL/0 programs",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples"))
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    inputFiles = [os.path.abspath(os.path.join(args.folder, f)) for f in sorted(os.listdir(args.folder)) if f.endswith(".pl0")]
+
+    print("{:16} {:>7} {:>7} {:>7} {:>8} {:>8} {:>8} {:>10} {:>10}".format(
+        "file", "bytes", "-O", "saved", "instr", "-O", "saved", "peep bytes", "peep instr"))
+
+    totals = [0] * 8
+    for inputFile in inputFiles:
+        plain = compileFile(inputFile, False)
+        if plain is None:
+            print("{:16} failed".format(os.path.basename(inputFile)))
+            continue
+        optimized = compileFile(inputFile, True)
+
+        plainImage = plain.codeGen.image()
+        optimizedImage = optimized.codeGen.image()
+        plainInstructions = countInstructions(plainImage)
+        optimizedInstructions = countInstructions(optimizedImage)
+        peephole = optimized.codeGen.peephole
+
+        row = [len(plainImage), len(optimizedImage), len(plainImage) - len(optimizedImage),
+               plainInstructions, optimizedInstructions, plainInstructions - optimizedInstructions,
+               peephole.savedBytes, peephole.savedInstructions]
+        print("{:16} {:7} {:7} {:7} {:8} {:8} {:8} {:10} {:10}".format(os.path.basename(inputFile), *row))
+        totals = [total + value for total, value in zip(totals, row)]
+
+    print("{:16} {:7} {:7} {:7} {:8} {:8} {:8} {:10} {:10}".format("total", *totals))
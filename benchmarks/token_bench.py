@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           token_bench.py
+#   description:    Benchmark measuring peak memory and allocated blocks of a
+#                   full-file token dump, once as Morphem list and once as
+#                   packed PL0TokenArray
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          python3 benchmarks/token_bench.py [--statements N] [inputFile]
+#
+
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pl0lexer import PL0BufferedLexer, MorphemCode
+from lexer_bench import generateSource
+
+
+def morphemList(inputFile):
+    lexer = PL0BufferedLexer(inputFile)
+    morphems = []
+    while lexer.lex().code != MorphemCode.EMPTY:
+        morphems.append(lexer.morphem)
+    return morphems
+
+
+def tokenArray(inputFile):
+    return PL0BufferedLexer(inputFile).tokenArray()
+
+
+def measure(dump, inputFile):
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+
+    tokens = dump(inputFile)
+
+    blocks = sys.getallocatedblocks() - blocks
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return len(tokens), current, peak, blocks
+
+
+def run(inputFile):
+    print("{:12} {:>8} {:>14} {:>14} {:>10}".format("dump", "tokens", "retained KiB", "peak KiB", "blocks"))
+    for name, dump in (("Morphem list", morphemList), ("token array", tokenArray)):
+        tokens, current, peak, blocks = measure(dump, inputFile)
+        print("{:12} {:8} {:14.1f} {:14.1f} {:10}".format(name, tokens, current / 1024, peak / 1024, blocks))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='PL0 Token Memory Benchmark')
+    parser.add_argument("--statements", "-s", help="number of generated statements", type=int, default=20000)
+    parser.add_argument("inputFile", nargs="?", help="PL/0 source to dump instead of generated input")
+    args = parser.parse_args()
+
+    if args.inputFile:
+        run(args.inputFile)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            inputFile = os.path.join(directory, "identifiers.pl0")
+            with open(inputFile, "w") as f:
+                f.write(generateSource(args.statements))
+            run(inputFile)
@@ -1,6 +1,4 @@
 REM python pl0parser.py ..\testfiles\tmin.pl0
 @echo off
-    for /R "..\testfiles\" %%f in (tmin*.pl0) do (
-    echo Compile %%~nf
-    python cpl0.py %%f
-)
\ No newline at end of file
+REM Compiles all test files in one process, one worker per CPU
+python cpl0.py --jobs 0 ..\testfiles
@@ -1,7 +1,4 @@
 #!/bin/bash
 
-for file in examples/*.pl0
-do
-  echo "Compiling ${file}"
-  python3 ./cpl0.py ${file}
-done
\ No newline at end of file
+# Compiles all examples in one process, one worker per CPU
+python3 ./cpl0.py --jobs 0 examples/
@@ -9,28 +9,226 @@
 #
 
 import argparse
+import gc
 import os
+import sys
+import time
 import logging
-import xmlwriter
-from pl0parser import PL0Parser
+from concurrent.futures import ProcessPoolExecutor
+from pl0compiler import compileSource, PL0CompileError, PL0CompileCache
+from pl0lexer import LEXER_BACKENDS
+from pl0codegen import writeFileAtomically
+
+# Compile cache of each worker process by (directory, size)
+workerCaches = {}
+
+# Seconds between two scans of the watched folder and seconds without
+# changes before the changed files get compiled
+WATCH_INTERVAL = 0.1
+WATCH_DEBOUNCE = 0.05
+
+
+# Compiles inputFile to the .cl0 file next to it (and the parse tree to
+# inputFile.xml with ast). Raises PL0CompileError on errors, then no
+# output gets written.
+def compileFile(inputFile, lexerBackend="buffered", ast=False, cache=None, optimize=False):
+    with open(inputFile, "rb") as f:
+        source = f.read()
+
+    # The parse tree only grows while parsing and holds no reference
+    # cycles. With the cyclic garbage collector running, its full
+    # collections walk the whole tree over and over again, which makes
+    # parsing long programs superlinear. The compiler owns this process,
+    # so the collector is paused here and not inside the library.
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        image, xml = compileSource(source, lexerBackend, ast, cache, optimize)
+    finally:
+        if gcEnabled:
+            gc.enable()
+
+    writeFileAtomically(os.path.splitext(inputFile)[0] + ".cl0", image)
+
+    if ast:
+        writeFileAtomically(inputFile + ".xml", xml.encode("utf-8"))
+
+
+def workerCache(cacheDirectory, cacheSize):
+    if cacheDirectory is None:
+        return None
+
+    if (cacheDirectory, cacheSize) not in workerCaches:
+        workerCaches[(cacheDirectory, cacheSize)] = PL0CompileCache(cacheDirectory, cacheSize)
+    return workerCaches[(cacheDirectory, cacheSize)]
+
+
+# Runs compileFile for the batch mode and returns (inputFile, errors,
+# duration, cache hit). It runs in the worker processes, so the errors
+# are passed back as text instead of being logged. Never raises.
+def compileJob(job):
+    inputFile, lexerBackend, ast, cacheDirectory, cacheSize, optimize = job
+    cache = workerCache(cacheDirectory, cacheSize)
+    hits = cache.hits if cache else 0
+
+    start = time.perf_counter()
+    try:
+        compileFile(inputFile, lexerBackend, ast, cache, optimize)
+        errors = []
+    except PL0CompileError as e:
+        errors = [str(diagnostic) for diagnostic in e.diagnostics]
+    # Anything else (unreadable file, no UTF-8, a bug in the compiler)
+    # only fails this file, the others of the batch still get compiled
+    except Exception as e:
+        errors = ["{}: {}".format(type(e).__name__, e)]
+
+    return inputFile, errors, time.perf_counter() - start, cache is not None and cache.hits > hits
+
+
+def quietWorker():
+    logging.disable(logging.ERROR)
+
+
+# Expands the directories among paths to the .pl0 files inside them
+def sourceFiles(paths):
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+
+        for directory, _, names in sorted(os.walk(path)):
+            files.extend(os.path.join(directory, name) for name in sorted(names) if name.endswith(".pl0"))
+
+    return files
+
+
+# Prints status and time of each compiled file, returns the number of
+# failed ones and of cache hits
+def printResults(results):
+    failed = 0
+    hits = 0
+    for inputFile, errors, duration, hit in results:
+        print("{:4} {:8.1f}ms  {}{}".format("FAIL" if errors else "OK", duration * 1000, inputFile, " (cached)" if hit else ""))
+        for error in errors:
+            print("      " + error)
+        if errors:
+            failed += 1
+        if hit:
+            hits += 1
+    return failed, hits
+
+
+# Compiles all files in this process or, with more than one job, in a
+# pool of worker processes. Returns the number of failed files.
+def compileBatch(files, lexerBackend, ast, jobs, cacheDirectory=None, cacheSize=None, optimize=False):
+    quietWorker()
+    jobList = [(inputFile, lexerBackend, ast, cacheDirectory, cacheSize, optimize) for inputFile in files]
+
+    start = time.perf_counter()
+    if jobs == 1:
+        failed, hits = printResults(map(compileJob, jobList))
+    else:
+        # Small files compile in well under a millisecond, so each worker
+        # gets them in chunks instead of one by one
+        chunksize = max(1, len(jobList) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=quietWorker) as executor:
+            failed, hits = printResults(executor.map(compileJob, jobList, chunksize=chunksize))
+
+    summary = "{} file(s), {} failed".format(len(files), failed)
+    if cacheDirectory is not None:
+        summary += ", {} cache hit(s), {} miss(es)".format(hits, len(files) - hits)
+    print(summary + " in {:.2f}s".format(time.perf_counter() - start))
+    return failed
+
+
+# Returns {path: (mtime, size)} of the .pl0 files in the folder
+def sourceState(directory):
+    state = {}
+    for inputFile in sourceFiles([directory]):
+        try:
+            stat = os.stat(inputFile)
+        except FileNotFoundError:
+            continue
+        state[inputFile] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+# Returns the files which are new or changed compared to state and the
+# new state. Editors save in several steps and a checkout touches many
+# files at once, so changes are only taken once the folder stayed the
+# same for WATCH_DEBOUNCE seconds.
+def changedSources(directory, state):
+    current = sourceState(directory)
+    if current == state:
+        return [], state
+
+    while True:
+        time.sleep(WATCH_DEBOUNCE)
+        settled = sourceState(directory)
+        if settled == current:
+            break
+        current = settled
+
+    return [f for f in sorted(current) if current[f] != state.get(f)], current
+
+
+# Polls the folder and compiles every .pl0 file when it gets created or
+# changed, starting with all files already there. Runs until Ctrl-C.
+def watch(directory, lexerBackend, ast, cacheDirectory=None, cacheSize=None, optimize=False):
+    quietWorker()
+    print("Watching {} (Ctrl-C to stop)".format(directory), flush=True)
+
+    state = {}
+    try:
+        while True:
+            changed, state = changedSources(directory, state)
+            if changed:
+                print("-- {} {} file(s) changed".format(time.strftime("%H:%M:%S"), len(changed)))
+                printResults(compileJob((inputFile, lexerBackend, ast, cacheDirectory, cacheSize, optimize)) for inputFile in changed)
+                sys.stdout.flush()
+
+            time.sleep(WATCH_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+
 
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='PL0 Compiler')
     parser.add_argument("--ast","-a",help="writes abstract syntax tree", action="store_true")
-    parser.add_argument("inputFile")
+    parser.add_argument("--lexer","-l",help="lexer backend (default: buffered)", choices=sorted(LEXER_BACKENDS), default="buffered")
+    parser.add_argument("--jobs","-j",help="worker processes for compiling many files, 0 for one per CPU (default: 1)", type=int, default=1)
+    parser.add_argument("--cache","-c",help="directory of the compile cache (default: no cache)", default=None)
+    parser.add_argument("--cache-size",help="size limit of the compile cache in MiB (default: 64)", type=float, default=64)
+    parser.add_argument("--optimize","-O",help="folds constant expressions and runs the peephole optimizer", action="store_true")
+    parser.add_argument("--watch","-w",help="compiles the .pl0 files of the folder whenever they change", metavar="FOLDER")
+    parser.add_argument("inputFile", nargs="*", help="PL/0 source files or folders with them")
     args = parser.parse_args()
 
-    logging.basicConfig(level=logging.DEBUG)
+    if not args.inputFile and args.watch is None:
+        parser.error("no input files")
+    if args.inputFile and args.watch is not None:
+        parser.error("--watch takes no input files, put them into the watched folder")
+    cacheSize = int(args.cache_size * 2**20)
+
+    if args.watch is not None:
+        watch(args.watch, args.lexer, args.ast, args.cache, cacheSize, args.optimize)
 
-    outputFile = os.path.splitext(args.inputFile)[0] + ".cl0"
-    
-    parser = PL0Parser(args.inputFile, outputFile)
+    # A single file keeps the log output of the compiler
+    elif len(args.inputFile) == 1 and not os.path.isdir(args.inputFile[0]) and args.jobs == 1:
+        logging.basicConfig(level=logging.DEBUG)
 
-    result = parser.parse()
-    if not result:
-        logging.error("[main]  Parser failed with Morphem " + str(parser.lexer.morphem))
-    elif args.ast:
-        xmlFile = args.inputFile + ".xml"
-        x = xmlwriter.XMLWriter(xmlFile)
-        x.writeAll(result)
\ No newline at end of file
+        cache = workerCache(args.cache, cacheSize)
+        try:
+            compileFile(args.inputFile[0], args.lexer, args.ast, cache, args.optimize)
+        except PL0CompileError as e:
+            logging.error("[main]  Parser failed with {} error(s)".format(len(e.diagnostics)))
+            sys.exit(1)
+        finally:
+            if cache is not None:
+                logging.info("[main]  Cache: {} hit(s), {} miss(es)".format(cache.hits, cache.misses))
+    else:
+        jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+        if compileBatch(sourceFiles(args.inputFile), args.lexer, args.ast, jobs, args.cache, cacheSize, args.optimize):
+            sys.exit(1)
@@ -7,6 +7,7 @@
 #   date:           24.01.2018
 #   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
 #
+import os
 import logging
 from enum import Enum
 import struct
@@ -54,22 +55,186 @@ class VMCode(Enum):
 
     END_OF_CODE = 30 #1E
 
+# Precompiled layout of each command: the opcode byte followed by its
+# 2-byte arguments. Displacements and jump distances are signed.
+COMMAND_FORMATS = {
+    VMCode.PUSH_VALUE_VAR_LOCAL: "<Bh",
+    VMCode.PUSH_VALUE_VAR_MAIN: "<Bh",
+    VMCode.PUSH_VALUE_VAR_GLOBAL: "<BhH",
+    VMCode.PUSH_ADDRESS_VAR_LOCAL: "<Bh",
+    VMCode.PUSH_ADDRESS_VAR_MAIN: "<Bh",
+    VMCode.PUSH_ADDRESS_VAR_GLOBAL: "<BhH",
+    VMCode.PUSH_CONST: "<BH",
+    VMCode.CALL: "<BH",
+    VMCode.JMP: "<Bh",
+    VMCode.JMP_NOT: "<Bh",
+    VMCode.ENTRY_PROC: "<BHHH",
+}
+
+# Indexed by the number of the VM code
+VMCODE_COUNT = len(VMCode)
+COMMAND_STRUCTS = [struct.Struct(COMMAND_FORMATS.get(vmcode, "<B")) for vmcode in VMCode]
+
+# Writes data to path by renaming a completely written temporary file
+# in the same folder, so path holds either the old or the new content.
+# The temporary file is created with mode 0o666 like open() does, so
+# the kernel applies the umask.
+def writeFileAtomically(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    while True:
+        temporaryPath = os.path.join(directory, ".tmp-" + os.urandom(6).hex())
+        try:
+            descriptor = os.open(temporaryPath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            break
+        except FileExistsError:
+            continue
+
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(data)
+        os.replace(temporaryPath, path)
+    except BaseException:
+        os.remove(temporaryPath)
+        raise
+
+# Symbolic target of a jump. A placed label stands in front of the next
+# command of the procedure. Lowering sets its address, the peephole
+# optimizer binds it to the command (None for the end of the procedure).
 class CGLabel:
-    def __init__(self, address):
-        self.address = address
-        self.distance = 0
+    __slots__ = ("instruction", "address")
+
+    def __init__(self):
+        self.instruction = None
+        self.address = None
+
+# A command of the intermediate code. Jumps refer to a CGLabel instead of
+# a relative address, jumps written with a fixed distance have none.
+class CGInstruction:
+    __slots__ = ("vmcode", "args", "target", "removed")
+
+    def __init__(self, vmcode, args, target=None):
+        self.vmcode = vmcode
+        self.args = args
+        self.target = target
+        self.removed = False
+
+    def size(self):
+        if self.target is not None:
+            return 3
+        if self.vmcode == VMCode.PUTSTRG.value:
+            return len(self.args[0]) + 2
+        return 1 + 2 * len(self.args)
+
+# Relative jumps, their distance counts from the end of the command
+JUMP_COMMANDS = (VMCode.JMP.value, VMCode.JMP_NOT.value)
+
+# Binds the labels placed in the intermediate code of a procedure to the
+# command following them and returns the commands only
+def bindLabels(code):
+    instructions = []
+    labels = []
+    for item in code:
+        if item.__class__ is CGLabel:
+            labels.append(item)
+            continue
+
+        for label in labels:
+            label.instruction = item
+        labels.clear()
+        instructions.append(item)
+
+    for label in labels:
+        label.instruction = None
+
+    return instructions
+
+# Places the labels of the jumps in front of the commands they are bound
+# to, the reverse of bindLabels()
+def placeLabels(instructions):
+    placed = {}
+    endLabels = []
+    for instruction in instructions:
+        label = instruction.target
+        if label is None or id(label) in placed:
+            continue
+
+        placed[id(label)] = label
+        if label.instruction is None:
+            endLabels.append(label)
+
+    labels = {}
+    for label in placed.values():
+        if label.instruction is not None:
+            labels.setdefault(id(label.instruction), []).append(label)
+
+    code = []
+    for instruction in instructions:
+        code.extend(labels.get(id(instruction), ()))
+        code.append(instruction)
+    code.extend(endLabels)
+    return code
+
+# Writes a command whose arguments don't match the signature of the
+# command, like displacements above 32767, argument by argument
+def encodeArguments(vmcodenr, args):
+    code = bytearray((vmcodenr,))
+    for arg in args:
+        code += struct.pack("<h" if arg < 0 else "<H", arg)
+    return code
+
+# Lowers the intermediate code of a procedure to the bytes of the VM. The
+# jumps get their distance once the address of their label is known.
+def lowerInstructions(code):
+    putString = VMCode.PUTSTRG.value
+    output = bytearray()
+    jumps = []
+    for item in code:
+        if item.__class__ is CGLabel:
+            item.address = len(output)
+            continue
+
+        vmcodenr = item.vmcode
+        if item.target is not None:
+            jumps.append((len(output), item))
+            output += b"\0\0\0"
+        elif vmcodenr == putString:
+            # Characters (already latin-1 encoded) and the terminating zero
+            output.append(vmcodenr)
+            output += item.args[0]
+            output.append(0)
+        else:
+            try:
+                output += COMMAND_STRUCTS[vmcodenr].pack(vmcodenr, *item.args)
+            except struct.error:
+                output += encodeArguments(vmcodenr, item.args)
+
+    # Labels placed nowhere count as the end of the procedure
+    for position, jump in jumps:
+        address = jump.target.address
+        if address is None:
+            address = len(output)
+        COMMAND_STRUCTS[jump.vmcode].pack_into(output, position, jump.vmcode, address - position - 3)
+
+    return output
 
 class PL0CodeGen:
 
-    def __init__(self, outputFilename):
+    def __init__(self, outputFilename=None):
         # For delayed subgraph
         self.codeCache = []
-        self.delayedSubgraph = False
 
+        # The whole image (header, procedures and constants) gets
+        # assembled in memory and written once the program is complete
         self.outputFilename = outputFilename
-        self.outputFile = open(self.outputFilename, "wb+")
+        self.codeImage = bytearray()
         self.outputBuffer = bytearray()
 
+        # Intermediate code of the current procedure: CGInstructions and
+        # the CGLabels placed between them. New commands go to code, which
+        # is either the procedure or the recorded code.
+        self.instructions = []
+        self.code = self.instructions
+
         # Add 2 byte placehoder for procedurecount at the
         # very beginning
         self.__append2Bytes__(48879) # hex(48879)=BEEF
@@ -83,12 +248,6 @@ class PL0CodeGen:
     def __appendByte__(self,value):
         self.__write__(struct.pack("<B",value))
 
-    def __frontInsertByte__(self,value):
-        if self.delayedSubgraph:
-            self.codeCache[-1].insert(0,struct.pack("<B",value))
-        else:
-            self.outputBuffer.insert(0,struct.pack("<B",value))
-        
     def __append2Bytes__(self,value):
         if(value < 0):
             self.__write__(struct.pack("<h",value))
@@ -101,10 +260,7 @@ class PL0CodeGen:
         self.__write__(struct.pack("<L",value))
 
     def __write__(self,value):
-        if self.delayedSubgraph:
-            self.codeCache[-1] += value
-        else:
-            self.outputBuffer += value
+        self.outputBuffer += value
 
     def writeConstList(self, constList):
 
@@ -114,13 +270,9 @@ class PL0CodeGen:
             self.__append4Bytes__(int(const.value))
 
     def putString(self,str):
-        # Write command
-        self.__appendByte__(VMCode.PUTSTRG.value)
-        
-        for c in str:
-            self.__appendByte__(ord(c))
-
-        self.__appendByte__(0)
+        # The characters are kept latin-1 encoded, lowering adds the
+        # command and the terminating zero
+        self.code.append(CGInstruction(VMCode.PUTSTRG.value, (str.encode("latin-1"),)))
 
         return True
 
@@ -130,36 +282,31 @@ class PL0CodeGen:
 
         vmcodenr = vmcode.value
 
-        if vmcodenr > len(VMCode):
+        if vmcodenr > VMCODE_COUNT:
             logging.error("[CodeGen] Unknown VM Code '{}'".format(vmcode))
             return False
 
-        # Write command
-        self.__appendByte__(vmcodenr)
-
-        # Write each argument as 2-byte value
-        for arg in args:
-            self.__append2Bytes__(arg)
+        self.code.append(CGInstruction(vmcodenr, args))
 
         return True
 
-    def setTotalCountOfProcedures(self, procedureCount):
-
-        # Remember where the file pointer is currently at
-        currentPosition = self.outputFile.tell()
+    # Writes a jump to the label, its distance gets calculated when the
+    # procedure is lowered
+    def writeJump(self,vmcode, label):
+        self.code.append(CGInstruction(vmcode.value, (), label))
 
-        # Go to the very beginning of the file
-        self.outputFile.seek(0, 0)
+        return True
 
-        # Write directly the count of procedure as 4 Byte number
-        # to the very first byte of the file
-        self.outputFile.write(struct.pack("H",int(procedureCount)))
+    def setTotalCountOfProcedures(self, procedureCount):
 
-        # Go back where we were before
-        self.outputFile.seek(currentPosition, 0)
+        # Write the count of procedures as 2 Byte number
+        # to the very first bytes of the image
+        self.codeImage[0:2] = struct.pack("<H",int(procedureCount))
 
     def setProcedureLength(self):
-        
+
+        # The length is known once the procedure is lowered to bytes
+        self.lowerProcedure()
         length = len(self.outputBuffer)
 
         if length < 2:
@@ -174,15 +321,20 @@ class PL0CodeGen:
 
         return True
 
+    # Replaces the intermediate code of the procedure by its bytes
+    def lowerProcedure(self):
+        self.outputBuffer += lowerInstructions(self.instructions)
+        self.instructions = self.code = []
+
     def recordCode(self):
-        self.delayedSubgraph = True
-        self.codeCache.append(bytearray())
+        self.code = []
+        self.codeCache.append(self.code)
 
     def stopRecordingCode(self):
-        self.delayedSubgraph = False
+        self.code = self.instructions
 
     def popRecordedCode(self):
-        self.outputBuffer.extend(self.codeCache.pop())
+        self.instructions.extend(self.codeCache.pop())
 
     def pushDelayedCommand(self,vmcode, args=[]):
         self.delayedCommands.append((vmcode, args))
@@ -194,42 +346,370 @@ class PL0CodeGen:
 
         return self.delayedCommands.pop()
 
+    # Creates a label for if/while, it stays on the label stack until
+    # the jumps to it are written and it is placed
     def pushLabel(self):
-        # Store the current position (=length of the current buffer)
-        # in order to calculate the relative address for if/while later
-        self.labels.append(CGLabel(len(self.outputBuffer)))
+        label = CGLabel()
+        self.labels.append(label)
+        return label
 
     def popLabel(self):
-        # Calculate relative address for if/while so they know
-        # where to jump to if condition is true 
-        label = self.labels.pop()
-
-        # Calculate relative address
-        label.distance = len(self.outputBuffer) - label.address
-        return label
+        return self.labels.pop()
 
-    def correctJmp(self, label,offset=0):
-
-        # Check if jump command (2 byte) + its first argument (2 byte)
-        # is inside the output buffer
-        if label.address + 4 >= len(self.outputBuffer):
-            logging.error("[CodeGen] Invalid Jump address")
-            return False
-        
-        #logging.info("Relative address: " + label.distance+offset)
-        b = struct.pack("<h", label.distance+offset)
-        self.outputBuffer[label.address+1] = b[0]
-        self.outputBuffer[label.address+2] = b[1]
+    # Lets the label point to the next command
+    def placeLabel(self, label):
+        self.code.append(label)
 
         return True
 
     def flushBuffer(self):
-        self.outputFile.write(self.outputBuffer)
+        if self.instructions:
+            self.lowerProcedure()
+        self.codeImage += self.outputBuffer
         self.outputBuffer = bytearray()
 
     def initOutputBuffer(self):
         self.outputBuffer = bytearray()
+        self.instructions = self.code = []
         
     def closeOutputfile(self):
         self.flushBuffer()
-        self.outputFile.close()
+        self.writeOutput()
+
+    # Writes the image in one go. The output is a file path, which gets
+    # replaced atomically, a binary file object (which stays open) or
+    # None to keep the code in memory only, see image().
+    def writeOutput(self):
+        if self.outputFilename is None:
+            return
+
+        if hasattr(self.outputFilename, "write"):
+            self.outputFilename.write(self.codeImage)
+        else:
+            writeFileAtomically(self.outputFilename, self.codeImage)
+
+    # Returns the code generated in memory
+    def image(self):
+        return bytes(self.codeImage)
+
+
+class PL0NullCodeGen(PL0CodeGen):
+
+    # Takes over from the code generator of a compilation which failed.
+    # The parser goes on looking for further errors, so the edge functions
+    # still generate code, but nothing gets written anymore. The output
+    # file is never written and the bookkeeping the recovery of the
+    # parser may leave inconsistent doesn't fail.
+    def __init__(self, codeGen):
+        self.codeCache = codeGen.codeCache
+        self.outputFilename = codeGen.outputFilename
+        self.codeImage = codeGen.codeImage
+        self.outputBuffer = codeGen.outputBuffer
+        self.instructions = codeGen.instructions
+        self.code = codeGen.code
+        self.labels = codeGen.labels
+        self.delayedCommands = codeGen.delayedCommands
+
+    def setTotalCountOfProcedures(self, procedureCount):
+        pass
+
+    def setProcedureLength(self):
+        return True
+
+    def popRecordedCode(self):
+        if self.codeCache:
+            super().popRecordedCode()
+
+    def popDelayedCommand(self):
+        if len(self.delayedCommands) == 0:
+            return (VMCode.POP, [])
+
+        return self.delayedCommands.pop()
+
+    def popLabel(self):
+        if len(self.labels) == 0:
+            self.pushLabel()
+
+        return super().popLabel()
+
+    def flushBuffer(self):
+        self.instructions = self.code = []
+        self.outputBuffer = bytearray()
+
+    def closeOutputfile(self):
+        pass
+
+
+# Folds the commands on constants, by the number of the VM code, into the
+# value computed at compile time. None leaves the command to the VM.
+FOLDED_UNARY_COMMANDS = {
+    VMCode.VZ_MINUS.value: lambda a: -a,
+    VMCode.ODD.value: lambda a: a % 2,
+}
+
+FOLDED_BINARY_COMMANDS = {
+    VMCode.OP_ADD.value: lambda a, b: a + b,
+    VMCode.OP_SUB.value: lambda a, b: a - b,
+    VMCode.OP_MULT.value: lambda a, b: a * b,
+    VMCode.OP_DIV.value: lambda a, b: a // b if b != 0 else None,
+    VMCode.CMP_EQ.value: lambda a, b: int(a == b),
+    VMCode.CMP_NE.value: lambda a, b: int(a != b),
+    VMCode.CMP_LT.value: lambda a, b: int(a < b),
+    VMCode.CMP_GT.value: lambda a, b: int(a > b),
+    VMCode.CMP_LE.value: lambda a, b: int(a <= b),
+    VMCode.CMP_GE.value: lambda a, b: int(a >= b),
+}
+
+# Only values the VM reads the same as signed 32-bit number get folded,
+# so wrapping and the rounding of negative quotients stay with the VM
+FOLDED_VALUE_MAX = 2**31 - 1
+
+
+class PL0FoldingCodeGen(PL0CodeGen):
+
+    # Evaluates constant subexpressions at compile time. Constants pushed
+    # by PUSH_CONST are held back, arithmetic, comparisons and ODD on held
+    # back constants get replaced by their result and only the remaining
+    # constants are written before the next other command. The values and
+    # the constants of folded results come from the namelist.
+    def __init__(self, outputFilename=None, nameList=None):
+        self.nameList = nameList
+
+        # (value, constant index) of the constants at the top of the
+        # stack which aren't written yet. The index of a folded value
+        # is None until it gets written.
+        self.pendingConstants = []
+
+        super().__init__(outputFilename)
+
+    def writeCommand(self,vmcode, args=[]):
+        vmcodenr = vmcode.value
+        pending = self.pendingConstants
+
+        if vmcodenr == VMCode.PUSH_CONST.value:
+            value = self.nameList.constantList[args[0]].value
+            if 0 <= value <= FOLDED_VALUE_MAX:
+                pending.append((value, args[0]))
+                return True
+        elif vmcodenr in FOLDED_BINARY_COMMANDS and len(pending) >= 2:
+            value = FOLDED_BINARY_COMMANDS[vmcodenr](pending[-2][0], pending[-1][0])
+            if value is not None and 0 <= value <= FOLDED_VALUE_MAX:
+                pending[-2:] = [(value, None)]
+                return True
+        elif vmcodenr in FOLDED_UNARY_COMMANDS and pending:
+            value = FOLDED_UNARY_COMMANDS[vmcodenr](pending[-1][0])
+            if 0 <= value <= FOLDED_VALUE_MAX:
+                pending[-1] = (value, None)
+                return True
+
+        self.writePendingConstants()
+        return super().writeCommand(vmcode, args)
+
+    # Writes the held back constants, folded values become (anonymous)
+    # constants now
+    def writePendingConstants(self):
+        for value, index in self.pendingConstants:
+            if index is None:
+                const = self.nameList.searchConstByValue(value)
+                if const is None:
+                    const = self.nameList.createConst(value)
+                index = const.index
+
+            super().writeCommand(VMCode.PUSH_CONST, [index])
+
+        self.pendingConstants.clear()
+
+    # Everything depending on the position in the code or switching the
+    # buffer needs the held back constants written first
+
+    def putString(self,str):
+        self.writePendingConstants()
+        return super().putString(str)
+
+    def writeConstList(self, constList):
+        self.writePendingConstants()
+        super().writeConstList(constList)
+
+    def setProcedureLength(self):
+        self.writePendingConstants()
+        return super().setProcedureLength()
+
+    def recordCode(self):
+        self.writePendingConstants()
+        super().recordCode()
+
+    def stopRecordingCode(self):
+        self.writePendingConstants()
+        super().stopRecordingCode()
+
+    def popRecordedCode(self):
+        self.writePendingConstants()
+        super().popRecordedCode()
+
+    def writeJump(self,vmcode, label):
+        self.writePendingConstants()
+        return super().writeJump(vmcode, label)
+
+    def placeLabel(self, label):
+        self.writePendingConstants()
+        return super().placeLabel(label)
+
+    def flushBuffer(self):
+        self.writePendingConstants()
+        super().flushBuffer()
+
+
+class PL0PeepholeOptimizer:
+
+    # Rewrites wasteful command sequences in the intermediate code of a
+    # procedure: jumps to the next command, jumps to jumps, conditional
+    # jumps on constants, double sign changes, adding or subtracting 0 and
+    # multiplying or dividing by 1 and code nothing jumps to. Commands
+    # only get removed, a label of a removed command moves on to the next
+    # remaining one.
+    def __init__(self, constantList):
+        self.constantList = constantList
+
+        # Sums over all optimized procedures
+        self.savedBytes = 0
+        self.savedInstructions = 0
+
+    # Returns the optimized intermediate code
+    def optimize(self, code):
+        instructions = bindLabels(code)
+
+        # Jumps written with a fixed distance can't be moved
+        if any(i.vmcode in JUMP_COMMANDS and i.target is None for i in instructions):
+            return code
+
+        count = len(instructions)
+        size = sum(i.size() for i in instructions)
+        changed = True
+        while changed:
+            changed = self.rewrite(instructions)
+            changed = self.removeUnreachable(instructions) or changed
+            instructions = self.compact(instructions)
+
+        self.savedBytes += size - sum(i.size() for i in instructions)
+        self.savedInstructions += count - len(instructions)
+        return placeLabels(instructions)
+
+    def constantValue(self, instruction):
+        if instruction.vmcode != VMCode.PUSH_CONST.value:
+            return None
+        return self.constantList[instruction.args[0]].value
+
+    # One pass over all rules, returns True if anything changed
+    def rewrite(self, instructions):
+        targets = set(id(i.target.instruction) for i in instructions if i.target is not None)
+        changed = False
+
+        for index, instruction in enumerate(instructions):
+            if instruction.removed:
+                continue
+
+            following = instructions[index + 1] if index + 1 < len(instructions) else None
+            vmcode = instruction.vmcode
+
+            if vmcode in JUMP_COMMANDS:
+                # Jump to a jump: go to the final target right away
+                target = instruction.target
+                hops = 0
+                while (target.instruction is not None and target.instruction.vmcode == VMCode.JMP.value
+                        and target.instruction.target is not target and hops < len(instructions)):
+                    target = target.instruction.target
+                    hops += 1
+
+                if target is not instruction.target:
+                    instruction.target = target
+                    changed = True
+
+                # Jump to the next command
+                if instruction.target.instruction is following:
+                    if vmcode == VMCode.JMP.value:
+                        instruction.removed = True
+                    else:
+                        # The condition has to leave the stack anyway
+                        instruction.vmcode = VMCode.POP.value
+                        instruction.target = None
+                    changed = True
+                continue
+
+            # The second command of a pair mustn't be a jump target
+            if following is None or following.removed or id(following) in targets:
+                continue
+
+            value = self.constantValue(instruction)
+            if value is not None and following.vmcode == VMCode.JMP_NOT.value:
+                # Condition known at compile time
+                if value != 0:
+                    following.removed = True
+                else:
+                    following.vmcode = VMCode.JMP.value
+                instruction.removed = True
+                changed = True
+            elif (vmcode == VMCode.VZ_MINUS.value and following.vmcode == VMCode.VZ_MINUS.value
+                    or value == 0 and following.vmcode in (VMCode.OP_ADD.value, VMCode.OP_SUB.value)
+                    or value == 1 and following.vmcode in (VMCode.OP_MULT.value, VMCode.OP_DIV.value)):
+                instruction.removed = True
+                following.removed = True
+                changed = True
+
+        return changed
+
+    # Marks the commands no path from the entry of the procedure reaches,
+    # returns True if there were any
+    def removeUnreachable(self, instructions):
+        reachable = set()
+        indices = dict((id(i), index) for index, i in enumerate(instructions))
+        pending = [0] if instructions else []
+        while pending:
+            index = pending.pop()
+            while index < len(instructions) and index not in reachable:
+                reachable.add(index)
+                instruction = instructions[index]
+                if instruction.target is not None and instruction.target.instruction is not None:
+                    pending.append(indices[id(instruction.target.instruction)])
+                if instruction.vmcode in (VMCode.JMP.value, VMCode.RET_PROC.value):
+                    break
+                index += 1
+
+        changed = False
+        for index, instruction in enumerate(instructions):
+            if index not in reachable and not instruction.removed:
+                instruction.removed = True
+                changed = True
+        return changed
+
+    # Drops the removed commands, their labels move on to the next
+    # remaining one
+    def compact(self, instructions):
+        successor = None
+        successors = {}
+        for instruction in reversed(instructions):
+            if instruction.removed:
+                successors[id(instruction)] = successor
+            else:
+                successor = instruction
+
+        remaining = [i for i in instructions if not i.removed]
+        for instruction in remaining:
+            label = instruction.target
+            if label is not None:
+                while label.instruction is not None and label.instruction.removed:
+                    label.instruction = successors[id(label.instruction)]
+        return remaining
+
+
+class PL0OptimizingCodeGen(PL0FoldingCodeGen):
+
+    # Code generator of -O: folds constants and runs the peephole
+    # optimizer over each procedure before it gets lowered
+    def __init__(self, outputFilename=None, nameList=None):
+        self.peephole = PL0PeepholeOptimizer(nameList.constantList)
+        super().__init__(outputFilename, nameList)
+
+    def setProcedureLength(self):
+        self.writePendingConstants()
+        self.instructions = self.peephole.optimize(self.instructions)
+        return super().setProcedureLength()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   file:           pl0compiler.py
+#   description:    Library interface compiling PL/0 source code in memory
+#   author:         Raphael Pour <info@raphaelpour.de>
+#   license:        GPL v3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+#
+#   usage:          from pl0compiler import compile
+#                   code = compile(b"VAR X; BEGIN ? X; ! X * X END.")
+#
+import io
+import os
+import sys
+import struct
+import hashlib
+import xmlwriter
+from pl0parser import PL0Parser
+from pl0codegen import writeFileAtomically
+
+# Modules whose source makes up the compiler version of the cache keys,
+# so a changed compiler never gets entries of an older one
+COMPILER_MODULES = ("pl0lexer", "pl0parser", "pl0namelist", "pl0codegen", "xmlwriter", "pl0compiler")
+
+
+class PL0CompileError(Exception):
+    """ Raised if the source has errors. diagnostics holds all errors the
+    parser found as PL0Diagnostic.
+    """
+
+    def __init__(self, diagnostics):
+        super().__init__("\n".join(str(diagnostic) for diagnostic in diagnostics))
+        self.diagnostics = diagnostics
+
+
+def compileProgram(source, lexerBackend="buffered", buildTree=False, optimize=False):
+    """ Compiles the source and returns the .cl0 image together with the
+    parse tree (None without buildTree). Nothing touches the filesystem.
+    optimize folds constant subexpressions.
+    """
+    if isinstance(source, str):
+        source = io.StringIO(source, newline=None)
+
+    parser = PL0Parser(source, None, lexerBackend, buildTree=buildTree, optimize=optimize)
+    result = parser.parse()
+    if not result:
+        raise PL0CompileError(parser.diagnostics)
+
+    return parser.codeGen.image(), result if buildTree else None
+
+
+class PL0CompileCache():
+    """ On-disk cache of compiled programs, shared by all compilers using
+    the same directory. An entry is keyed by the hash of the source, the
+    compiler version and the options and holds the .cl0 image and the
+    XML of the parse tree if it was requested.
+
+    Entries are written to a temporary file and renamed, so concurrent
+    compilers never see a partial entry. Each hit touches the entry and
+    when the directory grows beyond maxSize bytes the least recently
+    used entries get removed until it is down to 90% of it.
+    """
+
+    SUFFIX = ".cl0cache"
+
+    # Size of the image in front of it
+    HEADER = struct.Struct("<L")
+
+    # Eviction goes down to this share of maxSize, so the following
+    # stores fit in again without scanning the directory each time
+    LOW_WATER = 0.9
+
+    compilerVersion = None
+
+    def __init__(self, directory, maxSize=64 * 2**20):
+        self.directory = directory
+        self.maxSize = maxSize
+        os.makedirs(directory, exist_ok=True)
+
+        if PL0CompileCache.compilerVersion is None:
+            PL0CompileCache.compilerVersion = self.versionHash()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Other processes write to the directory as well, so this is only
+        # an estimate. It gets corrected by a scan before evicting.
+        self.size = sum(size for _, size, _ in self.entries())
+        if self.size > self.maxSize:
+            self.evict()
+
+    @staticmethod
+    def versionHash():
+        digest = hashlib.sha256()
+        for name in COMPILER_MODULES:
+            __import__(name)
+            with open(sys.modules[name].__file__, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def key(self, source, options):
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+
+        digest = hashlib.sha256(source)
+        digest.update(self.compilerVersion.encode("ascii"))
+        digest.update(repr(options).encode("utf-8"))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    # Returns (path, size, last use) of every entry
+    def entries(self):
+        result = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(self.SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                result.append((entry.path, stat.st_size, stat.st_mtime))
+        return result
+
+    # Returns (image, xml) of the entry or None. xml is None for entries
+    # stored without parse tree.
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            # Missing, or e.g. not readable for this user in a shared folder
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            # Entries of other users can't be touched, they just age
+            pass
+
+        header = self.HEADER.size
+        if len(data) < header or header + self.HEADER.unpack_from(data)[0] > len(data):
+            # Broken entry, e.g. from another program writing to the directory
+            self.remove(path)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        end = header + self.HEADER.unpack_from(data)[0]
+        xml = data[end:].decode("utf-8") if end < len(data) else None
+        return data[header:end], xml
+
+    def store(self, key, image, xml=None):
+        data = self.HEADER.pack(len(image)) + image
+        if xml is not None:
+            data += xml.encode("utf-8")
+
+        # Readable for every user of a shared folder as the umask allows
+        writeFileAtomically(self.path(key), data)
+
+        self.size += len(data)
+        if self.size > self.maxSize:
+            self.evict()
+
+    # Removes the least recently used entries until the cache is down
+    # to LOW_WATER of maxSize
+    def evict(self):
+        entries = self.entries()
+        self.size = sum(size for _, size, _ in entries)
+        if self.size <= self.maxSize:
+            return
+
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if self.size <= self.maxSize * self.LOW_WATER:
+                break
+            self.remove(path)
+            self.size -= size
+            self.evictions += 1
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def compileSource(source, lexerBackend="buffered", ast=False, cache=None, optimize=False):
+    """ Compiles the source and returns the .cl0 image and the parse tree
+    as XML text (None without ast). With a PL0CompileCache, a cached
+    result is returned without lexing and parsing the source.
+    """
+    if cache is not None:
+        key = cache.key(source, (lexerBackend, ast, optimize))
+        entry = cache.load(key)
+        if entry is not None:
+            return entry
+
+    image, tree = compileProgram(source, lexerBackend, buildTree=ast, optimize=optimize)
+    xml = xmlwriter.XMLWriter().parse(tree) if ast else None
+
+    if cache is not None:
+        cache.store(key, image, xml)
+    return image, xml
+
+
+def compile(source, lexerBackend="buffered", cache=None, optimize=False):
+    """ Compiles PL/0 source code given as str or UTF-8 bytes and returns
+    the .cl0 image as bytes. Raises PL0CompileError on errors.
+    """
+    return compileSource(source, lexerBackend, cache=cache, optimize=optimize)[0]
+
+
+def compileWithAst(source, lexerBackend="buffered", cache=None, optimize=False):
+    """ Like compile(), but returns the .cl0 image and the parse tree as
+    XML text.
+    """
+    return compileSource(source, lexerBackend, ast=True, cache=cache, optimize=optimize)
@@ -11,7 +11,10 @@ import sys
 import re
 import os
 import logging
+import array
+import io
 from enum import Enum
+from types import MappingProxyType
 
 
 class MorphemCode(Enum):
@@ -20,6 +23,7 @@ class MorphemCode(Enum):
     SYMBOL = 3
     IDENT = 4
     STRING = 5
+    INVALID = 6
 
 
 class Symbol(Enum):
@@ -50,6 +54,8 @@ class Symbol(Enum):
 
 class Morphem():
 
+    __slots__ = ("code", "value", "lines", "cols")
+
     def __init__(self):
         self.code = MorphemCode.EMPTY
         self.value  = ""
@@ -72,6 +78,11 @@ class Morphem():
         self.value = value
         self.code = MorphemCode.STRING
 
+    # Rejected token, no edge of the parser accepts it
+    def setInvalid(self, value):
+        self.value = value
+        self.code = MorphemCode.INVALID
+
     def __str__(self):
 
         value = self.value
@@ -80,8 +91,55 @@ class Morphem():
         
         return "{:2}:{:2} {:18}: {}".format(self.lines, self.cols, self.code, value)
 
+class PL0TokenArray():
+
+    # Morphems packed into one array of ints, four fields per token:
+    # (code, value index, line, col). Each distinct value is stored once
+    # in the values table. The ints are signed, because the column of a
+    # token following a multi-line string or comment can be negative.
+    FIELDS = 4
+
+    def __init__(self):
+        self.tokens = array.array("i")
+        self.values = []
+        self.valueIndex = {}
+
+    def append(self, morphem):
+        index = self.valueIndex.get(morphem.value)
+        if index is None:
+            index = len(self.values)
+            self.valueIndex[morphem.value] = index
+            self.values.append(morphem.value)
+
+        self.tokens.extend((morphem.code.value, index, morphem.lines, morphem.cols))
+
+    def __len__(self):
+        return len(self.tokens) // self.FIELDS
+
+    # Unpacks the token at the given index into a Morphem
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+
+        start = index * self.FIELDS
+        morphem = Morphem()
+        morphem.code = MorphemCode(self.tokens[start])
+        morphem.value = self.values[self.tokens[start + 1]]
+        morphem.lines = self.tokens[start + 2]
+        morphem.cols = self.tokens[start + 3]
+        return morphem
+
+
 class PL0Lexer():
 
+    # Keyword -> Symbol, built once. Every symbol name counts as a keyword
+    # as long as it's a word starting with a keyword letter (state 9).
+    KEYWORDS = MappingProxyType(dict(Symbol.__members__))
+
+    # Number literals have to fit into the 4 byte constant slots
+    # of the code file (see PL0CodeGen.writeConstList)
+    NUMBER_MAX = 0xFFFFFFFF
+
     #  Class | Description
     #  ------+---------------------------
     #    0   | Valid Special Chars
@@ -100,7 +158,7 @@ class PL0Lexer():
     stateMat = []
 
     def __init__(self, inputFile):
-        self.sourceFile = open(inputFile, "r")
+        self.sourceFile = self.openSource(inputFile)
         self.morphem = Morphem()
         self.currentChar = ""
         self.outBuffer = ""
@@ -168,7 +226,9 @@ class PL0Lexer():
 
         self.morphem = Morphem()
 
+        # The source gets closed as soon as it's read completely
         if self.currentChar == "":
+            self.close()
             return self.morphem
 
         while self.currentState != 16:
@@ -179,12 +239,13 @@ class PL0Lexer():
             if not self.currentChar:
                 if self.outBuffer:
                     self.end()
+                self.close()
                 break
 
             cvIndex = ord(self.currentChar)
             if cvIndex >= len(self.charVector):
-                logging.error("[Lexer] Char Vector Index out of range with char '{}' ({}), Char Vector's size is {}".format(
-                    self.controlSymbolsToString(self.currentChar), ord(self.currentChar), len(self.charVector)))
+                self.invalidChar()
+                break
 
             charClass = self.charVector[cvIndex]
             if charClass > 11:
@@ -268,7 +329,7 @@ class PL0Lexer():
 
         # Number
         elif self.currentState == 1:
-            self.morphem.setNumber(float(self.outBuffer))
+            self.setNumber(self.outBuffer)
 
         # Letters
         elif self.currentState == 2:
@@ -288,10 +349,9 @@ class PL0Lexer():
 
         # Potential-Keyword
         elif self.currentState == 9:
-            for name, member in Symbol.__members__.items():
-                if self.outBuffer == name:
-                    self.morphem.setSymbol(member)
-                    break
+            keyword = self.KEYWORDS.get(self.outBuffer)
+            if keyword is not None:
+                self.morphem.setSymbol(keyword)
             else:
                 self.morphem.setIdentifier(self.outBuffer)
 
@@ -301,6 +361,27 @@ class PL0Lexer():
         else:
             logging.error("[Lexer] Unknown State '{}'".format(self.currentState))
 
+    # A char outside the char vector ends a pending token in front of it,
+    # like any other char which can't continue the token. Otherwise, also
+    # inside comments and strings, it becomes an invalid morphem on its
+    # own, so the parser reports it with its position.
+    def invalidChar(self):
+        if self.currentState == 15:
+            # String closed by its quote
+            self.rewindEnd()
+        elif 1 <= self.currentState <= 10:
+            self.end()
+        else:
+            self.logInvalidChar(self.currentChar)
+            self.morphem.setInvalid(self.currentChar)
+            self.morphem.lines = self.lines
+            self.morphem.cols = self.cols
+            self.next()
+
+    def logInvalidChar(self, char):
+        logging.error("[Lexer] Char Vector Index out of range with char '{}' ({}), Char Vector's size is {}".format(
+            self.controlSymbolsToString(char), ord(char), len(self.charVector)))
+
     def controlSymbolsToString(self, s):
         out = ""
         if s == '\n':
@@ -314,9 +395,381 @@ class PL0Lexer():
 
         return out
 
-    def __del__(self):
-        if self.sourceFile is not None:
+    # Sets the morphem to the exact integer value of the number literal
+    # or rejects the literal if it's out of range
+    def setNumber(self, text):
+        value = int(text)
+        if value > self.NUMBER_MAX:
+            logging.error("[Lexer] Number {} at {}:{} is out of range (max {})".format(
+                text, self.morphem.lines, self.morphem.cols, self.NUMBER_MAX))
+            self.morphem.setInvalid(text)
+        else:
+            self.morphem.setNumber(value)
+
+    # Lexes the rest of the source and packs all morphems into a PL0TokenArray
+    def tokenArray(self):
+        tokens = PL0TokenArray()
+        for morphem in self:
+            tokens.append(morphem)
+
+        return tokens
+
+    # The source can be a file path, the source itself as bytes or any
+    # opened text stream like sys.stdin or io.StringIO. Only files opened
+    # by the lexer itself get closed by it. Bytes get the same newline
+    # translation as an opened file, so "\r\n" counts as one line break.
+    def openSource(self, source):
+        self.ownsSourceFile = True
+
+        if isinstance(source, bytes):
+            return io.StringIO(source.decode("utf-8"), newline=None)
+
+        if hasattr(source, "read"):
+            self.ownsSourceFile = False
+            return source
+
+        return open(source, "r")
+
+    def close(self):
+        if self.sourceFile is not None and self.ownsSourceFile:
             self.sourceFile.close()
+        self.sourceFile = None
+
+    # with PL0Lexer(path) as lexer: ...
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    # Delivers the morphems until EOF, so callers don't have to
+    # check for the empty morphem themselves
+    def __iter__(self):
+        while self.lex().code != MorphemCode.EMPTY:
+            yield self.morphem
+
+    # for morphem in PL0Lexer.iter(source): ...
+    # The stream lexer reads one char ahead and keeps only the current
+    # token, so even huge sources are lexed in constant memory.
+    @classmethod
+    def iter(cls, source):
+        lexer = cls(source)
+        try:
+            yield from lexer
+        finally:
+            lexer.close()
+
+
+class PL0BufferedLexer(PL0Lexer):
+    """ Lexer which reads the whole source file at once and walks it
+    by index. It runs the same state matrix as PL0Lexer, but the actions
+    are translated to flags and executed inline on local variables.
+    Instead of growing the outBuffer char by char, the token text is
+    sliced out of the source buffer when the token ends.
+    """
+
+    # Action flags, executed in this order
+    REWIND = 1
+    WRITE = 2
+    READ = 4
+    END = 8
+
+    def __init__(self, inputFile):
+        super().__init__(inputFile)
+
+        # The first char was already read as look-ahead, the rest of the
+        # file is read in one go
+        self.source = self.currentChar + self.sourceFile.read()
+        self.close()
+
+        # Position of the current char inside the source buffer
+        self.position = 0
+
+        # Translate the edge functions of the state matrix into flags
+        actionFlags = {
+            self.writeReadEnd: self.WRITE | self.READ | self.END,
+            self.writeRead: self.WRITE | self.READ,
+            self.upperWriteEnd: self.WRITE | self.READ,
+            self.read: self.READ,
+            self.rewindRead: self.REWIND | self.READ,
+            self.rewindEnd: self.REWIND | self.END,
+            self.end: self.END,
+        }
+        flagMat = [[(nextState, actionFlags[action]) for nextState, action in row] for row in self.stateMat]
+
+        # Look up the transition of each state directly by char
+        self.transitions = [
+            {chr(cvIndex): row[charClass] for cvIndex, charClass in enumerate(self.charVector)}
+            for row in flagMat
+        ]
+
+    def lex(self):
+        self.morphem = Morphem()
+
+        if self.currentChar == "":
+            return self.morphem
+
+        source = self.source
+        sourceLength = len(source)
+        transitions = self.transitions
+
+        position = self.position
+        lines = self.lines
+        cols = self.cols
+
+        # Boundaries of the token text inside the source buffer
+        tokenStart = tokenEnd = position
+
+        rewindFlag = self.REWIND
+        writeFlag = self.WRITE
+        readFlag = self.READ
+        endFlag = self.END
+        writeReadFlags = writeFlag | readFlag
+
+        state = 0
+        while state != 16:
+
+            # EOF reached, end an untokenized token without automaton table
+            if position >= sourceLength:
+                if tokenEnd > tokenStart:
+                    self.currentState = state
+                    self.lines = lines
+                    self.cols = cols
+                    self.end(tokenStart, tokenEnd)
+                break
+
+            char = source[position]
+            transition = transitions[state].get(char)
+            if transition is None:
+                # Same as PL0Lexer.invalidChar()
+                self.currentState = state
+                self.lines = lines
+                self.cols = cols
+                if state == 15:
+                    self.end(tokenStart, tokenEnd - 1)
+                elif 1 <= state <= 10:
+                    self.end(tokenStart, tokenEnd)
+                else:
+                    self.logInvalidChar(char)
+                    self.morphem.setInvalid(char)
+                    self.morphem.lines = lines
+                    self.morphem.cols = cols
+                    position += 1
+                    cols += 1
+                break
+            nextState, flags = transition
+
+            # Most chars are written and read, or only read (whitespaces,
+            # comments), so those two actions are checked first
+            if flags == writeReadFlags:
+                if tokenEnd == tokenStart:
+                    tokenStart = position
+                position += 1
+                tokenEnd = position
+                cols += 1
+                if char == "\n" or char == "\r":
+                    cols = 1
+                    lines += 1
+
+            elif flags == readFlag:
+                position += 1
+                cols += 1
+                if char == "\n" or char == "\r":
+                    cols = 1
+                    lines += 1
+
+            else:
+                if flags & rewindFlag and tokenEnd > tokenStart:
+                    tokenEnd -= 1
+
+                if flags & writeFlag:
+                    if tokenEnd == tokenStart:
+                        tokenStart = position
+                    tokenEnd = position + 1
+
+                if flags & readFlag:
+                    cols += 1
+                    if char == "\n" or char == "\r":
+                        cols = 1
+                        lines += 1
+                    position += 1
+
+                if flags & endFlag:
+                    self.currentState = state
+                    self.lines = lines
+                    self.cols = cols
+                    self.end(tokenStart, tokenEnd)
+
+            state = nextState
+
+        self.currentState = state
+        self.position = position
+        self.lines = lines
+        self.cols = cols
+        self.currentChar = source[position] if position < sourceLength else ""
+
+        return self.morphem
+
+    # Beenden
+    def end(self, tokenStart, tokenEnd):
+
+        # Slice the token text out of the source buffer. Idents and
+        # keywords are the only tokens written in upper case.
+        self.outBuffer = self.source[tokenStart:tokenEnd]
+        if self.currentState in (2, 9):
+            self.outBuffer = self.outBuffer.upper()
+
+        super().end()
+
+
+class PL0RegexLexer(PL0BufferedLexer):
+    """ Lexer which tokenizes the source buffer with one master regular
+    expression instead of the state matrix. It delivers the same morphemes
+    at the same positions as PL0Lexer, including its quirks: the char right
+    after a block comment is skipped and a string closed at EOF keeps its
+    closing quote.
+    """
+
+    # Leading control chars/whitespaces are skipped by the same match. BREAK
+    # reaches up to the last line break in front of the token.
+    TOKEN_PATTERN = re.compile(r"""
+        (?P<BREAK>[\x00-\x20]*[\n\r])?[\x00-\x20]*
+        (?:
+              (?P<WORD>[A-Za-z][A-Za-z0-9]*)
+            | (?P<NUMBER>[0-9]+)
+            | (?P<SYMBOL>[!#-)+-.;?@[-`{-\x7f=*] | [:<>](?!=) | /(?!\*))
+            | (?P<DOUBLE>:=|<=|>=)
+            | (?P<STRING>"(?P<TEXT>[^"]*(?:""[^"]*)*)"(?!"))
+            | (?P<COMMENT>/\*(?:[^*]|\*[^*/]|\*\*)*\*/[\s\S]?)
+            | (?P<OPEN_STRING>"(?P<OPEN_TEXT>[\s\S]*))
+            | (?P<OPEN_COMMENT>/\*[\s\S]*)
+            | (?P<EOF>\Z)
+        )""", re.VERBOSE)
+
+    # Chars outside the char vector of PL0Lexer
+    INVALID_PATTERN = re.compile(r"[^\x00-\x7f]")
+
+    DOUBLE_SYMBOLS = {
+        ":=": Symbol.ASSIGN,
+        "<=": Symbol.LESSER_EQUAL,
+        ">=": Symbol.GREATER_EQUAL,
+    }
+
+    # Only words starting with one of these letters can be keywords
+    KEYWORD_LETTERS = frozenset("ABCDEFINOPRTVW")
+
+    def __init__(self, inputFile):
+        super().__init__(inputFile)
+
+        # Start of the current line inside the source buffer
+        self.lineStart = 0
+
+        # Position of the next invalid char, searched again once it's passed
+        self.invalidPosition = -1
+
+    def lex(self):
+        morphem = self.morphem = Morphem()
+        source = self.source
+
+        while True:
+            match = self.TOKEN_PATTERN.match(source, self.position)
+
+            if self.invalidPosition < self.position:
+                invalid = self.INVALID_PATTERN.search(source, self.position)
+                self.invalidPosition = len(source) if invalid is None else invalid.start()
+
+            # Only invalid chars are left unmatched. Inside the match they
+            # break off a comment or string like in PL0Lexer.invalidChar().
+            if match is None or self.invalidPosition < match.end():
+                position = self.invalidPosition
+                char = source[position]
+                self.logInvalidChar(char)
+                self.countLines(self.position, position)
+                morphem.setInvalid(char)
+                morphem.lines = self.lines
+                morphem.cols = position - self.lineStart + 1
+                self.position = position + 1
+                break
+
+            kind = match.lastgroup
+            end = match.end()
+            self.position = end
+
+            if match.start("BREAK") >= 0:
+                self.countLines(match.start(), match.end("BREAK"))
+
+            if kind == "SYMBOL":
+                text = match.group(kind)
+                morphem.setSymbol(text)
+
+            elif kind == "WORD":
+                text = match.group(kind).upper()
+
+                # Potential keyword
+                keyword = self.KEYWORDS.get(text)
+                if keyword is not None and text[0] in self.KEYWORD_LETTERS and text.isalpha():
+                    morphem.setSymbol(keyword)
+                else:
+                    morphem.setIdentifier(text)
+
+            elif kind == "NUMBER":
+                text = match.group(kind)
+                morphem.lines = self.lines
+                morphem.cols = end - self.lineStart + 1 - len(text)
+                self.setNumber(text)
+
+            elif kind == "DOUBLE":
+                text = match.group(kind)
+                morphem.setSymbol(self.DOUBLE_SYMBOLS[text])
+
+            elif kind == "STRING":
+                text = match.group("TEXT")
+
+                # The closing quote is only removed if it's followed by another char
+                if end == len(source):
+                    text += '"'
+                morphem.setString(text)
+                self.countLines(match.start(kind), end)
+
+            elif kind == "COMMENT" or kind == "OPEN_COMMENT":
+                self.countLines(match.start(kind), end)
+                continue
+
+            elif kind == "OPEN_STRING":
+                # Unterminated string at EOF -> empty morphem with position
+                text = match.group("OPEN_TEXT")
+                if text:
+                    logging.error("[Lexer] Unterminated string at EOF")
+                    self.countLines(match.start(kind), end)
+                    morphem.lines = self.lines
+                    morphem.cols = end - self.lineStart + 1 - len(text)
+                break
+
+            else:
+                # EOF
+                break
+
+            morphem.lines = self.lines
+            morphem.cols = end - self.lineStart + 1 - len(text)
+            break
+
+        self.currentChar = source[self.position:self.position + 1]
+        return morphem
+
+    def countLines(self, start, end):
+        # Each '\n' and '\r' counts as a new line
+        lineBreaks = self.source.count("\n", start, end) + self.source.count("\r", start, end)
+        if lineBreaks:
+            self.lines += lineBreaks
+            self.lineStart = max(self.source.rfind("\n", start, end), self.source.rfind("\r", start, end)) + 1
+
+
+# Lexer backends selectable by name, e.g. from the parser
+LEXER_BACKENDS = {
+    "stream": PL0Lexer,
+    "buffered": PL0BufferedLexer,
+    "regex": PL0RegexLexer,
+}
 
 
 if __name__ == '__main__':
@@ -329,19 +782,16 @@ if __name__ == '__main__':
     else:
         sourceFile = sys.argv[1]
 
-    if not os.path.exists(sourceFile):
-        print("File doesn't exist")
-        sys.exit(1)
-
     print("[i] using sourcefile {}".format(sourceFile))
-    p = PL0Lexer(inputFile=sourceFile)
 
-    while True:
-        morphem = p.lex()
-    
-        if morphem.code == MorphemCode.EMPTY :
-            break
+    # '-' lexes stdin
+    if sourceFile == "-":
+        sourceFile = sys.stdin
+    elif not os.path.exists(sourceFile):
+        print("File doesn't exist")
+        sys.exit(1)
 
+    for morphem in PL0Lexer.iter(sourceFile):
         print(str(morphem))
 
     print("done.")
\ No newline at end of file
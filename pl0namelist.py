@@ -11,31 +11,49 @@ import logging
 
 #
 # All NL*-Classes are only Data-Structures to hold
-# the neccessary information for building up a namelist
+# the neccessary information for building up a namelist.
+# Generated programs declare tens of thousands of them, so
+# they use slots instead of an instance dict.
 #
 
 class NLIdent():
+    __slots__ = ("name", "value")
+
     def __init__(self, name, value=None):
         self.name = name
         self.value = value
 
 class NLProc(NLIdent):
+    __slots__ = ("parent", "constants", "variables", "childProcedures", "names",
+                 "bindings", "paramAddressOffset", "localAddressOffset", "index")
+
     def __init__(self, name,parent,index):
         super().__init__(name)
         self.parent = parent
         self.constants = []
         self.variables = []
         self.childProcedures = []
+
+        # Local idents by name for the lookups
+        self.names = {}
+
+        # Idents resolved by the parser inside this procedure,
+        # filled and invalidated by the parser
+        self.bindings = {}
+
         self.paramAddressOffset = -16
         self.localAddressOffset = 0
         self.index = index
 
 class NLConst(NLIdent):
+    __slots__ = ("index",)
+
     def __init__(self, value,index,name=None):
         super().__init__(name,value)
         self.index = index
 
 class NLVar(NLIdent):
+    __slots__ = ("parent", "addressOffset", "procedureParameter", "fields")
 
     def __init__(self, name,addressOffset, parent,value=None, procedureParameter=False, fields=0):
         super().__init__(name,value)
@@ -62,6 +80,10 @@ class PL0NameList:
         # build up with all the NL*-Classes.
         self.procedures = []
         self.constantList = []
+
+        # Constant pool by value, the index of a constant is its
+        # position in constantList
+        self.constantIndex = {}
         
         # Main Programm will be the first procedure without a parent
         self.procedures.append(NLProc(parent=None,name="main",index=0))
@@ -95,19 +117,15 @@ class PL0NameList:
 
         # Check if value is already in the global constant list
         # If not: index will be the length of the list
-        index = len(self.constantList)
-        cachedConst = None
-        for c in self.constantList:
-            if c.value == value:
-                cachedConst = c
-                index = c.index
-                break
+        cachedConst = self.constantIndex.get(value)
 
         # If the constant is not already existent in the global
         # constant list, create it
         if cachedConst is None:
-            cachedConst = NLConst(value,index=index)
+            cachedConst = NLConst(value,index=len(self.constantList))
             self.constantList.append(cachedConst)
+            self.constantIndex[value] = cachedConst
+        index = cachedConst.index
 
         # If the constant is anonym, the procedure will get the
         # instance of the global constant list for more storage efficency
@@ -118,7 +136,8 @@ class PL0NameList:
         else:
             newConst = NLConst(value,index,name)
         
-        self.currentProcedure.childProcedures.append(newConst)
+        self.currentProcedure.constants.append(newConst)
+        self.addName(self.currentProcedure, newConst)
         return newConst
 
     def createProcedureParam(self,name):
@@ -129,6 +148,7 @@ class PL0NameList:
 
         newVar = NLVar(name=name,parent=self.currentProcedure,addressOffset=currentOffset, procedureParameter=True)
         self.currentProcedure.variables.append(newVar)
+        self.addName(self.currentProcedure, newVar)
 
         return newVar
 
@@ -155,6 +175,7 @@ class PL0NameList:
         newVar = NLVar(name=name,parent=self.currentProcedure,addressOffset=currentOffset)
         # Add variable to the local variable list of the current procedure
         self.currentProcedure.variables.append(newVar)
+        self.addName(self.currentProcedure, newVar)
         
         return newVar
 
@@ -187,6 +208,7 @@ class PL0NameList:
         # Append new procedure as child to the current
         # Procedure
         parent.childProcedures.append(newProc)
+        self.addName(parent, newProc)
 
         # Append new procedure to the global procedure list
         self.procedures.append(newProc)
@@ -210,10 +232,19 @@ class PL0NameList:
         return True
 
     def searchConstByValue(self,value):
-        for const in self.constantList:
-            if const.value == value:
-                return const
-        return None
+        return self.constantIndex.get(value)
+
+    def addName(self, procedure, ident):
+        """ Makes the ident visible by its name in the scope of the
+        procedure. If the name is already taken, child procedures and
+        constants win over variables, otherwise the first one stays.
+        """
+        if ident.name is None:
+            return
+
+        known = procedure.names.get(ident.name)
+        if known is None or (isinstance(known, NLVar) and not isinstance(ident, NLVar)):
+            procedure.names[ident.name] = ident
 
     def searchIdentNameLocal(self, name, procedure=None):
         """ The Local Scope is provided using the local search to
@@ -227,22 +258,9 @@ class PL0NameList:
         if procedure.name == name:
             return procedure
 
-        # Procedure has child named after given ident-name?
-        for cp in procedure.childProcedures:
-            if cp.name == name:
-                return cp
-
-        # Local Constant named after the given ident-name?
-        for c in procedure.constants:
-            if c.name == name:
-                return c
-
-        # Local Variable named after the given ident-name?
-        for v in procedure.variables:
-            if v.name == name:
-                return v
-
-        return None
+        # Child procedure, constant or variable named after the given
+        # ident-name?
+        return procedure.names.get(name)
 
     def searchIdentNameGlobal(self,name,procedure=None):
         """ In order to check if an ident is used in global scope,
@@ -253,23 +271,20 @@ class PL0NameList:
         if procedure is None:
             procedure = self.currentProcedure
 
-        while 1:
-            ident = self.searchIdentNameLocal(name=name, procedure=procedure)
-
-            if ident is None:
-                # If the current procedure has no parent
-                # -> we reached the main procedure and the ident
-                # doesn't exist
-                if procedure is None or procedure.parent is None:
-                    return None
-                else:
-                    # Otherwise we use the parent of the current procedure
-                    # for the next round. This enables the "from inner to outer"
-                    # search
-                    procedure = procedure.parent
-            else:
+        # Walk up the parent chain until the main procedure. This
+        # enables the "from inner to outer" search
+        while procedure is not None:
+            if procedure.name == name:
+                return procedure
+
+            ident = procedure.names.get(name)
+            if ident is not None:
                 return ident
 
+            procedure = procedure.parent
+
+        return None
+
     def isLocalIdentName(self,name,procedure=None):
         return self.searchIdentNameLocal(procedure=procedure, name=name) != None
 
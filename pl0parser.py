@@ -13,9 +13,9 @@ from enum import Enum
 import pprint
 import logging
 import xmlwriter
-from pl0lexer import PL0Lexer, Morphem, MorphemCode, Symbol
+from pl0lexer import PL0Lexer, Morphem, MorphemCode, Symbol, LEXER_BACKENDS
 from pl0namelist import NLIdent, NLProc, NLConst, NLVar, PL0NameList
-from pl0codegen import PL0CodeGen,VMCode
+from pl0codegen import PL0CodeGen,PL0NullCodeGen,PL0OptimizingCodeGen,VMCode
 
 class NonTerminal(Enum):
     PROGRAM = 0
@@ -55,6 +55,12 @@ class EdgeType(Enum):
     SUBGRAPH_ = 4
     GRAPH_END = 8
 
+# Integer codes of the edge types used by the parse tables
+NIL______ = EdgeType.NIL______.value
+SYMBOL___ = EdgeType.SYMBOL___.value
+MORPHEM__ = EdgeType.MORPHEM__.value
+SUBGRAPH_ = EdgeType.SUBGRAPH_.value
+GRAPH_END = EdgeType.GRAPH_END.value
 
 class Edge():
     def __init__(self, _type, value, emitter, nextEdge, alternativeEdge, nonterminal):
@@ -96,92 +102,310 @@ class Edge():
         return result
 
 
+class TreeNode():
+
+    # Node of the parse tree. Subgraph nodes keep their children in sub,
+    # for terminals it stays None.
+    __slots__ = ("type", "value", "lines", "cols", "sub")
+
+    def __init__(self, _type, value, lines, cols, sub=None):
+        self.type = _type
+        self.value = value
+        self.lines = lines
+        self.cols = cols
+        self.sub = sub
+
+
+class PL0Diagnostic():
+
+    # Error found while compiling. kind is either "syntax" or "semantic",
+    # lines and cols point to the morphem the error was detected at.
+    __slots__ = ("kind", "lines", "cols", "message")
+
+    def __init__(self, kind, lines, cols, message):
+        self.kind = kind
+        self.lines = lines
+        self.cols = cols
+        self.message = message
+
+    def __str__(self):
+        return "{}:{}: {}".format(self.lines, self.cols, self.message)
+
+    def __repr__(self):
+        return "PL0Diagnostic({!r}, {}, {}, {!r})".format(self.kind, self.lines, self.cols, self.message)
+
+
+class PL0SyntaxTables():
+
+    # The syntax graph flattened into parallel tuples, indexed by a global
+    # edge number. The graphs are laid out one after another in the order
+    # of NonTerminal, so the program graph starts at edge 0.
+    #
+    #   types        | EdgeType value as int
+    #   values       | symbol/morphem code or the first edge of the subgraph
+    #   actions      | index into emitters, 0 means no emitter
+    #   next         | edge to go on with on success
+    #   alternative  | edge to try on failure, 0 means none (the first
+    #                | edge of the program graph is never an alternative)
+    #   names        | name of the non-terminal the edge belongs to
+    #   chainHead    | first edge of the alternative chain the edge is
+    #                | part of, the error recovery retries from there
+    #   first        | FIRST set of each graph by its first edge, see
+    #                | firstSet()
+    def __init__(self, graph):
+
+        self.start = {}
+        offset = 0
+        for nonterminal in NonTerminal:
+            self.start[nonterminal] = offset
+            offset += len(graph[nonterminal])
+
+        types = []
+        values = []
+        actions = []
+        nextEdges = []
+        alternatives = []
+        names = []
+        emitters = [None]
+
+        for nonterminal in NonTerminal:
+            offset = self.start[nonterminal]
+            for edge in graph[nonterminal]:
+                types.append(edge.type.value)
+
+                if edge.type == EdgeType.SUBGRAPH_:
+                    values.append(self.start[edge.value])
+                else:
+                    values.append(edge.value)
+
+                if edge.f is None:
+                    actions.append(0)
+                else:
+                    if edge.f not in emitters:
+                        emitters.append(edge.f)
+                    actions.append(emitters.index(edge.f))
+
+                nextEdges.append(offset + edge.next)
+                alternatives.append(offset + edge.alternative if edge.alternative else 0)
+                names.append(nonterminal.name)
+
+        self.types = tuple(types)
+        self.values = tuple(values)
+        self.actions = tuple(actions)
+        self.next = tuple(nextEdges)
+        self.alternative = tuple(alternatives)
+        self.names = tuple(names)
+        self.emitters = tuple(emitters)
+
+        # Edges which are no alternative of another edge start a chain
+        chainHeads = list(range(len(types)))
+        for edge in range(len(types)):
+            if edge in alternatives:
+                continue
+            alternative = alternatives[edge]
+            while alternative:
+                chainHeads[alternative] = edge
+                alternative = alternatives[alternative]
+        self.chainHead = tuple(chainHeads)
+
+        self.first = {}
+        for start in self.start.values():
+            self.firstSet(start, set())
+
+    # Returns the FIRST set of the graph starting at the given edge as
+    # (symbols, morphem codes). Without any of them as current morphem
+    # the graph fails before taking anything and without calling an
+    # edge function, so the parser doesn't need to descend into it.
+    # Graphs which may succeed without taking a morphem (NIL edge or
+    # graph end among the first edges) get None: they can't be skipped.
+    def firstSet(self, start, visiting):
+        if start in self.first:
+            return self.first[start]
+
+        # Left recursion, no FIRST set
+        if start in visiting:
+            return None
+        visiting.add(start)
+
+        symbols = set()
+        codes = set()
+        edge = start
+        while True:
+            if self.types[edge] == SYMBOL___:
+                symbols.add(self.values[edge])
+            elif self.types[edge] == MORPHEM__:
+                codes.add(self.values[edge])
+            elif self.types[edge] == SUBGRAPH_:
+                subgraphFirst = self.firstSet(self.values[edge], visiting)
+                if subgraphFirst is None:
+                    symbols = None
+                    break
+                symbols |= subgraphFirst[0]
+                codes |= subgraphFirst[1]
+            else:
+                symbols = None
+                break
+
+            # If the edge fails, its alternative is tried on the same morphem
+            if self.alternative[edge] == 0:
+                break
+            edge = self.alternative[edge]
+
+        first = None if symbols is None else (frozenset(symbols), frozenset(codes))
+        self.first[start] = first
+        visiting.discard(start)
+        return first
+
+
 class PL0Parser():
 
-    def __init__(self, inputFilename, outputFilenname):
+    # Flat parse tables shared by all parser instances. They are compiled
+    # from the syntax graph when the first parser gets created.
+    syntaxTables = None
+
+    # After a syntax error the parser skips morphems up to the next of
+    # these and resumes there
+    SYNC_SYMBOLS = frozenset((";", ".", Symbol.END))
+
+    # Opcode families of a bound variable, indexing the opcode tables
+    # below. See bindIdent().
+    VAR_MAIN = 0
+    VAR_LOCAL = 1
+    VAR_GLOBAL = 2
+
+    PUSH_VALUE_OPCODES = (VMCode.PUSH_VALUE_VAR_MAIN, VMCode.PUSH_VALUE_VAR_LOCAL, VMCode.PUSH_VALUE_VAR_GLOBAL)
+    PUSH_ADDRESS_OPCODES = (VMCode.PUSH_ADDRESS_VAR_MAIN, VMCode.PUSH_ADDRESS_VAR_LOCAL, VMCode.PUSH_ADDRESS_VAR_GLOBAL)
+
+    # The input is anything the lexer takes (path, bytes or text stream),
+    # the output anything the code generator takes (path, binary file or
+    # None to generate the code in memory). With optimize, constant
+    # subexpressions get folded and each procedure runs through the
+    # peephole optimizer.
+    def __init__(self, inputFilename, outputFilenname=None, lexerBackend="buffered", buildTree=True, optimize=False):
+
+        # Compile the syntax graph once per process
+        if PL0Parser.syntaxTables is None:
+            PL0Parser.syntaxTables = PL0SyntaxTables(PL0Parser.syntaxGraph())
+
+        # Without the parse tree only the edge functions run and
+        # parse() returns True instead of the tree
+        self.buildTree = buildTree
+
+        # Subgraphs descended into and subgraphs skipped because the
+        # current morphem isn't in their FIRST set
+        self.subgraphDescents = 0
+        self.subgraphsSkipped = 0
+
+        # All errors found so far. The parser doesn't stop at the first
+        # one, see error() and recover().
+        self.diagnostics = []
+        self.errorMorphem = None
+        self.recoveryMorphem = None
+
+        # Init Lexer
+        self.inputFilename = inputFilename
+        self.lexer = LEXER_BACKENDS[lexerBackend](self.inputFilename)
+
+        # Init NameList
+        self.nameList = PL0NameList()
+        self.currentIdent = None
+        self.currentIndex = 0
+
+        # Init Code Generator
+        self.outputFilename = outputFilenname
+        self.optimize = optimize
+        if optimize:
+            self.codeGen = PL0OptimizingCodeGen(self.outputFilename, self.nameList)
+        else:
+            self.codeGen = PL0CodeGen(self.outputFilename)
+
+    # Returns the syntax graph as lists of edges per non-terminal. The
+    # emitters are plain functions which get the parser passed as self.
+    @classmethod
+    def syntaxGraph(cls):
 
         # Short identifier for the edge functions
 
         # Program
-        PR1 = self.programmEnd
+        PR1 = cls.programmEnd
 
         # Block
-        BL1 = self.blockCheckConstIdent
-        BL2 = self.blockCreateConst
-        BL3 = self.blockCreateVar
-        BL4 = self.blockCreateProc
-        BL5 = self.blockEndProcedure
-        BL6 = self.blockInitCodeGen
-        BL7 = self.blockReturnProcedure
+        BL1 = cls.blockCheckConstIdent
+        BL2 = cls.blockCreateConst
+        BL3 = cls.blockCreateVar
+        BL4 = cls.blockCreateProc
+        BL5 = cls.blockEndProcedure
+        BL6 = cls.blockInitCodeGen
+        BL7 = cls.blockReturnProcedure
 
         # Statement
-        ST1 = self.statementAssignmentLeftSide
-        ST2 = self.statementAssignmentRightSide
-        ST3 = self.statementIfCondition
-        ST4 = self.statementThenStatement
-        ST5 = self.statementWhileCondition
-        ST6 = self.statementWhileAfterCondition
-        ST7 = self.statementWhileEnd
-        #ST8 = self.statementCallBeforeParamsProc # Replaced with PL1/PL2
-        ST9 = self.statementGetVal
-        ST10 = self.statementPutVal
-        ST11 = self.statementPutStr
-        ST12 = self.statementElseKeyword
-        ST13 = self.statementElseStatement
+        ST1 = cls.statementAssignmentLeftSide
+        ST2 = cls.statementAssignmentRightSide
+        ST3 = cls.statementIfCondition
+        ST4 = cls.statementThenStatement
+        ST5 = cls.statementWhileCondition
+        ST6 = cls.statementWhileAfterCondition
+        ST7 = cls.statementWhileEnd
+        #ST8 = cls.statementCallBeforeParamsProc # Replaced with PL1/PL2
+        ST9 = cls.statementGetVal
+        ST10 = cls.statementPutVal
+        ST11 = cls.statementPutStr
+        ST12 = cls.statementElseKeyword
+        ST13 = cls.statementElseStatement
 
         # Condition
-        CO1 = self.conditionOdd
-        CO2 = self.conditionEQ
-        CO3 = self.conditionNE
-        CO4 = self.conditionLT
-        CO5 = self.conditionLE
-        CO6 = self.conditionGT
-        CO7 = self.conditionGE
-        CO8 = self.conditionReleaseCommand
+        CO1 = cls.conditionOdd
+        CO2 = cls.conditionEQ
+        CO3 = cls.conditionNE
+        CO4 = cls.conditionLT
+        CO5 = cls.conditionLE
+        CO6 = cls.conditionGT
+        CO7 = cls.conditionGE
+        CO8 = cls.conditionReleaseCommand
 
         # Expression
-        EX1 = self.expressionNegSign
-        EX2 = self.expressionAdd
-        EX3 = self.expressionSub
+        EX1 = cls.expressionNegSign
+        EX2 = cls.expressionAdd
+        EX3 = cls.expressionSub
 
-        TE1 = self.termMul
-        TE2 = self.termDiv
+        TE1 = cls.termMul
+        TE2 = cls.termDiv
 
         # Factor
-        FA1 = self.factorPushNumber
-        FA2 = self.factorPushIdent
+        FA1 = cls.factorPushNumber
+        FA2 = cls.factorPushIdent
 
         # Language Extension
         # For loop
-        FOR1 = self.forBeforeCondition
-        FOR2 = self.forBeforeIncrement
-        FOR3 = self.forAfterIncrement
-        FOR4 = self.forAfterStatement
+        FOR1 = cls.forBeforeCondition
+        FOR2 = cls.forBeforeIncrement
+        FOR3 = cls.forAfterIncrement
+        FOR4 = cls.forAfterStatement
 
         # Parameter list
         
-        PL1 = self.statementCallBeforeParamsProc
-        PL2 = self.statementCallAfterParamsProc
+        PL1 = cls.statementCallBeforeParamsProc
+        PL2 = cls.statementCallAfterParamsProc
 
-        PD1 = self.procedureParameter
-        PD2 = self.procedureEndParameterList
+        PD1 = cls.procedureParameter
+        PD2 = cls.procedureEndParameterList
 
         # Array
-        ARR0 = self.arrayPushAddr
-        AR1 = self.arraySetIndex
-        AR2 = self.arrayCrate
-        AR3 = self.arrayAccess
-        AR4 = self.arraySwap
-        FA3 = self.factorGetIdent
-        ST14= self.statementAssigmnmentIdent
-        ST15= self.statementGetValIdent
-        ST16= self.statementGetValToArray
+        ARR0 = cls.arrayPushAddr
+        AR1 = cls.arraySetIndex
+        AR2 = cls.arrayCrate
+        AR3 = cls.arrayAccess
+        AR4 = cls.arraySwap
+        FA3 = cls.factorGetIdent
+        ST14= cls.statementAssigmnmentIdent
+        ST15= cls.statementGetValIdent
+        ST16= cls.statementGetValToArray
 
         # Logical Expressions
-        LE1 = self.logicalOr
-        LT1 = self.logicalNot
-        LT2 = self.logicalNotAnd
-        LT3 = self.logicalAnd
+        LE1 = cls.logicalOr
+        LT1 = cls.logicalNot
+        LT2 = cls.logicalNotAnd
+        LT3 = cls.logicalAnd
 
         # Init Syntax rules
 
@@ -552,7 +776,7 @@ class PL0Parser():
             Edge(EdgeType.GRAPH_END,None,None,0,0,FORS)             # 9
         ]
 
-        self.edges = {
+        return {
             PROG: programEdges,                  #  0
             BLCK: blockEdges,                    #  1
             EXPR: expressionEdges,               #  2
@@ -584,138 +808,319 @@ class PL0Parser():
             LFACT : logicalFactorEdges          
         }
 
-        # Init Lexer
-        self.inputFilename = inputFilename
-        self.lexer = PL0Lexer(self.inputFilename)
+    def parse(self):
 
-        # Init NameList
-        self.nameList = PL0NameList()
-        self.currentIdent = None
-        self.currentIndex = 0
+        try:
+            result = self.parseProgram()
+        finally:
+            # The parser may stop before the lexer reached the end
+            self.lexer.close()
 
-        # Init Code Generator
-        self.outputFilename = outputFilenname
-        self.codeGen = PL0CodeGen(self.outputFilename)
+        if not result and not self.diagnostics:
+            self.syntaxError()
 
-    def parse(self, edge=None, path=[]):
+        # The errors are in self.diagnostics
+        if self.diagnostics:
+            return False
+        return result
 
-        morphemProcessed = False
-        localPath = []
+    def parseProgram(self):
 
-        success = False
+        tables = self.syntaxTables
+        types = tables.types
+        values = tables.values
+        firstSets = tables.first
+        buildTree = self.buildTree
 
         # Initialize Parser if we are called for the first time
         if self.lexer.morphem.code == MorphemCode.EMPTY:
             self.lexer.lex()
 
-        if not edge:
-            startEdge = self.edges[NonTerminal.PROGRAM][0]
-            startList = [{
-                'value': str(startEdge.nonterminal.name),
-                'type': EdgeType.SUBGRAPH_,
-                'pos': (self.lexer.morphem.lines, self.lexer.morphem.cols),
-                'sub': []
-            }]
-            result = self.parse(startEdge, startList)
-            if result:
-                startList[0]['sub'] = result
-                return startList
-            else:
-                return False
+        edge = tables.start[NonTerminal.PROGRAM]
+        startList = [TreeNode(EdgeType.SUBGRAPH_, tables.names[edge], self.lexer.morphem.lines, self.lexer.morphem.cols)]
+
+        # Instead of recursing into subgraphs, the state of the calling
+        # graph is pushed as (subgraph edge, localPath, morphemProcessed,
+        # accepted) and restored when the subgraph ends or fails.
+        # accepted tells if the graph took any symbol, morphem or subgraph,
+        # a subgraph which took nothing counts as failed.
+        stack = []
+        localPath = [] if buildTree else None
+        morphemProcessed = False
+        accepted = False
 
         while True:
 
             # Check Edge type
+            edgeType = types[edge]
 
             # Symbol detected -> Syntactically right Symbol?
-            if edge.type == EdgeType.SYMBOL___:
-                success = self.lexer.morphem.value == edge.value
+            if edgeType == SYMBOL___:
+                success = self.lexer.morphem.value == values[edge]
                 if success:
-                    localPath.append({
-                        'value': self.lexer.morphem.value,
-                        'type': edge.type,
-                        'pos': (self.lexer.morphem.lines, self.lexer.morphem.cols)})
+                    accepted = True
+                    if buildTree:
+                        morphem = self.lexer.morphem
+                        localPath.append(TreeNode(EdgeType.SYMBOL___, morphem.value, morphem.lines, morphem.cols))
 
             # Morphem detected -> Syntacticaly right morphem?
-            elif edge.type == EdgeType.MORPHEM__:
-                success = self.lexer.morphem.code == edge.value
+            elif edgeType == MORPHEM__:
+                success = self.lexer.morphem.code == values[edge]
                 if success:
-                    localPath.append({
-                        'value': self.lexer.morphem.value,
-                        'type': edge.type,
-                        'pos': (self.lexer.morphem.lines, self.lexer.morphem.cols)
-                    })
-
-            # Subgraph detected -> Go deeper
-            elif edge.type == EdgeType.SUBGRAPH_:
-                nextEdge = self.edges[edge.value][0]
-                localPath.append({
-                    'value': nextEdge.nonterminal.name,
-                    'type': EdgeType.SUBGRAPH_,
-                    'pos': (self.lexer.morphem.lines, self.lexer.morphem.cols),
-                    'sub': []
-                })
-
-                result = self.parse(nextEdge, path + localPath)
-                if result:
+                    accepted = True
+                    if buildTree:
+                        morphem = self.lexer.morphem
+                        localPath.append(TreeNode(EdgeType.MORPHEM__, morphem.value, morphem.lines, morphem.cols))
+
+            # Subgraph detected -> Go deeper, unless the current morphem
+            # can't start it anyway
+            elif edgeType == SUBGRAPH_:
+                nextEdge = values[edge]
+                first = firstSets[nextEdge]
+                if first is not None and self.lexer.morphem.value not in first[0] and self.lexer.morphem.code not in first[1]:
+                    self.subgraphsSkipped += 1
+                    success = False
+                else:
+                    self.subgraphDescents += 1
+                    if buildTree:
+                        localPath.append(TreeNode(EdgeType.SUBGRAPH_, tables.names[nextEdge], self.lexer.morphem.lines, self.lexer.morphem.cols))
+
+                    stack.append((edge, localPath, morphemProcessed, accepted))
+                    edge = nextEdge
+                    localPath = [] if buildTree else None
+                    morphemProcessed = False
+                    accepted = False
+                    continue
+
+            # End detected -> Return the current parse-tree to the calling graph
+            elif edgeType == GRAPH_END:
+                result = localPath
+                subgraphAccepted = accepted
+
+                if not stack:
+                    if not subgraphAccepted:
+                        return False
+                    if not buildTree:
+                        return True
+                    startList[0].sub = result
+                    return startList
+
+                edge, localPath, morphemProcessed, accepted = stack.pop()
+                edgeType = SUBGRAPH_
+
+                if subgraphAccepted:
                     success = True
-                    
+                    accepted = True
+
                     # Combines the local parse tree with the deeper one
-                    # This allows to ignore the delivered path argument
-                    localPath[-1]['sub'] = result
+                    if buildTree:
+                        localPath[-1].sub = result
                 else:
                     success = False
 
                     # Delete the subgraph from the local Path because it wasn't
                     # successful
-                    localPath.pop()
-
-
+                    if buildTree:
+                        localPath.pop()
 
-            # End detected -> Return the current parse-tree
-            elif edge.type == EdgeType.GRAPH_END:
-                return localPath
-            elif edge.type == EdgeType.NIL______:
+            elif edgeType == NIL______:
                 success = True
 
             # Call Emitter
-            if success and edge.f:
-                success = edge.f()
+            if success and tables.actions[edge]:
+                emitter = tables.emitters[tables.actions[edge]]
+                success = emitter(self)
                 if success is None:
-                    logging.error("[Parser] Missing valid return value of edge function {}(). It returned with None".format(edge.f.__name__))
+                    logging.error("[Parser] Missing valid return value of edge function {}(). It returned with None".format(emitter.__name__))
 
             # Check alternatives if evaluation of edge type
             # wasn't successful
-
-            if not success:
-                if edge.alternative != 0:
-                    edge = self.edges[edge.nonterminal][edge.alternative]
-                elif morphemProcessed:
-                    logging.error("[Parser] Syntax Error near {}:{}: {}".format(
-                        self.lexer.morphem.lines,
-                        self.lexer.morphem.cols,
-                        self.lexer.morphem.value))
-
-                    errorEdge = {
-                        'value': "ERROR",
-                        'type': EdgeType.NIL______,
-                        'pos': (self.lexer.morphem.lines, self.lexer.morphem.cols)
-                    }
-                    localPath.append(errorEdge)
-                    x = xmlwriter.XMLWriter("error.xml")
-                    x.writeAll(localPath)
-                    sys.exit(1)
-                else:
-                    # It's BACKTRACKIN' TIME
-
-                    return False
-            else:
+            if success:
                 # Accept morphem
-                if edge.type in [EdgeType.SYMBOL___, EdgeType.MORPHEM__]:
+                if edgeType == SYMBOL___ or edgeType == MORPHEM__:
                     self.lexer.lex()
-                edge = self.edges[edge.nonterminal][edge.next]
+                edge = tables.next[edge]
                 morphemProcessed = True
-        return localPath
+                continue
+
+            while tables.alternative[edge] == 0:
+                if morphemProcessed:
+                    # Edge functions report their errors themselves
+                    if self.errorMorphem is not self.lexer.morphem:
+                        self.syntaxError()
+
+                    if buildTree:
+                        localPath.append(TreeNode(EdgeType.NIL______, "ERROR", self.lexer.morphem.lines, self.lexer.morphem.cols))
+
+                    edge, localPath = self.recover(stack, edge, localPath)
+                    if edge is None:
+                        return False
+                    morphemProcessed = True
+                    accepted = True
+                    break
+
+                # It's BACKTRACKIN' TIME
+                # The subgraph edge of the calling graph failed as well
+                if not stack:
+                    return False
+
+                edge, localPath, morphemProcessed, accepted = stack.pop()
+                if buildTree:
+                    localPath.pop()
+            else:
+                edge = tables.alternative[edge]
+
+    # Records an error at the current morphem. From the first error on
+    # no code gets written anymore, the parser only goes on to find
+    # further errors.
+    def error(self, message, kind="semantic"):
+        logging.error("[Parser] " + message)
+        self.addDiagnostic(kind, message)
+
+    def syntaxError(self):
+        morphem = self.lexer.morphem
+        logging.error("[Parser] Syntax Error near {}:{}: {}".format(morphem.lines, morphem.cols, morphem.value))
+        self.addDiagnostic("syntax", "Syntax Error near {}".format(morphem.value))
+
+    def addDiagnostic(self, kind, message):
+        morphem = self.lexer.morphem
+        self.diagnostics.append(PL0Diagnostic(kind, morphem.lines, morphem.cols, message))
+        self.errorMorphem = morphem
+
+        if not isinstance(self.codeGen, PL0NullCodeGen):
+            self.codeGen = PL0NullCodeGen(self.codeGen)
+
+    # Panic mode error recovery. Skips morphems up to the next of
+    # SYNC_SYMBOLS and resumes at the innermost position which can take
+    # it: the alternative chain of the failed edge or the edge following
+    # the subgraph edge of one of the calling graphs. The graphs left on
+    # the way keep their partial parse tree.
+    # Returns the edge and the localPath to go on with, or (None, None)
+    # if the input ends first.
+    def recover(self, stack, edge, localPath):
+        tables = self.syntaxTables
+
+        # Each recovery takes at least one morphem, otherwise the parser
+        # could fail again and again at the same place
+        if self.lexer.morphem is self.recoveryMorphem:
+            self.lexer.lex()
+
+        while True:
+            morphem = self.lexer.morphem
+            while morphem.code != MorphemCode.EMPTY and morphem.value not in self.SYNC_SYMBOLS:
+                morphem = self.lexer.lex()
+
+            if morphem.code == MorphemCode.EMPTY:
+                return None, None
+
+            self.recoveryMorphem = morphem
+
+            if self.canResume(tables.chainHead[edge]):
+                return tables.chainHead[edge], localPath
+
+            for depth in range(len(stack) - 1, -1, -1):
+                if not self.canResume(tables.next[stack[depth][0]]):
+                    continue
+
+                # Leave the graphs above the one to resume in
+                leftEdge = edge
+                while True:
+                    self.leaveGraph(leftEdge)
+                    frameEdge, parentPath, _, _ = stack.pop()
+                    if localPath is not None:
+                        parentPath[-1].sub = localPath
+                    localPath = parentPath
+
+                    if len(stack) == depth:
+                        return tables.next[frameEdge], localPath
+                    leftEdge = frameEdge
+
+            # Nothing takes the synchronizing symbol, skip it as well
+            self.lexer.lex()
+
+    # Tells if the alternative chain starting at edge can take the
+    # current morphem. NIL edges are followed, a subgraph counts if the
+    # morphem is in its FIRST set or if it has none.
+    def canResume(self, edge):
+        tables = self.syntaxTables
+        morphem = self.lexer.morphem
+
+        chains = [edge]
+        visited = set()
+        while chains:
+            edge = chains.pop()
+            while edge not in visited:
+                visited.add(edge)
+
+                edgeType = tables.types[edge]
+                if edgeType == SYMBOL___:
+                    if morphem.value == tables.values[edge]:
+                        return True
+                elif edgeType == MORPHEM__:
+                    if morphem.code == tables.values[edge]:
+                        return True
+                elif edgeType == SUBGRAPH_:
+                    first = tables.first[tables.values[edge]]
+                    if first is None or morphem.value in first[0] or morphem.code in first[1]:
+                        return True
+                elif edgeType == NIL______:
+                    chains.append(tables.next[edge])
+
+                if tables.alternative[edge] == 0:
+                    break
+                edge = tables.alternative[edge]
+
+        return False
+
+    # A procedure gets opened by its declaration and closed at the end of
+    # its block (BL4 and BL5). If the recovery leaves the block or the
+    # declaration in between, the procedure has to be closed here.
+    def leaveGraph(self, edge):
+        tables = self.syntaxTables
+        name = tables.names[edge]
+        position = edge - tables.start[NonTerminal[name]]
+
+        if name == NonTerminal.BLOCK.name or (name == NonTerminal.PROCEDURE_DECLARATION.name and 2 <= position <= 5):
+            if self.nameList.currentProcedure is not None:
+                self.nameList.endProc()
+
+    # Resolves an ident used inside the current procedure to its binding
+    # (kind, opcode family, args). The kind is the class of the ident,
+    # the args are the constant index for constants and the displacement
+    # and, for global variables, the procedure index for variables.
+    # Bindings are cached per procedure, so each name gets searched once
+    # per scope until a declaration invalidates the cache.
+    def bindIdent(self, identName):
+        procedure = self.nameList.currentProcedure
+        binding = procedure.bindings.get(identName)
+        if binding is not None:
+            return binding
+
+        ident = self.nameList.searchIdentNameGlobal(identName)
+        if ident is None:
+            return None
+
+        if isinstance(ident, NLProc):
+            binding = (NLProc, None, ())
+        elif isinstance(ident, NLConst):
+            binding = (NLConst, None, (ident.index,))
+        elif ident.parent == self.nameList.mainProc:
+            # Main Variable
+            binding = (NLVar, self.VAR_MAIN, (ident.addressOffset,))
+        elif ident.parent == procedure:
+            # Local Scope Variable
+            binding = (NLVar, self.VAR_LOCAL, (ident.addressOffset,))
+        else:
+            # Global scope Variable
+            binding = (NLVar, self.VAR_GLOBAL, (ident.addressOffset, ident.parent.index))
+
+        procedure.bindings[identName] = binding
+        return binding
+
+    # Declarations may shadow or move idents, so the bindings of the
+    # current procedure get resolved again afterwards
+    def invalidateBindings(self):
+        self.nameList.currentProcedure.bindings.clear()
 
     #
     # EDGE FUNCTIONS
@@ -745,7 +1150,7 @@ class PL0Parser():
 
         # Create Constant, print error if locally existing
         if self.nameList.isLocalIdentName(constIdent):
-            logging.error("[Parser] Can't create Const-Ident: Ident {} already existing.".format(constIdent))
+            self.error("Can't create Const-Ident: Ident {} already existing.".format(constIdent))
 
             # Error-Handling  
             return False
@@ -763,10 +1168,11 @@ class PL0Parser():
             return False
         
         # Get the value from our current morphem
-        value = int(self.lexer.morphem.value)
+        value = self.lexer.morphem.value
 
         # Add Constant to our namelist
         self.nameList.createConst(name=self.currentIdent,value=value)
+        self.invalidateBindings()
 
         # Reset ident to None in order to avoid errors
         self.currentIdent = None
@@ -780,7 +1186,7 @@ class PL0Parser():
 
         # Create Constant, print error if locally existing
         if self.nameList.isLocalIdentName(ident):
-            logging.error("[Parser] Can't create Var-Ident: Ident {} already existing.".format(ident))
+            self.error("Can't create Var-Ident: Ident {} already existing.".format(ident))
 
             # Error-Handling  
             return False
@@ -788,6 +1194,7 @@ class PL0Parser():
         self.currentIdent = ident
         # Add Variable to our namelist
         self.nameList.createVar(name=ident)
+        self.invalidateBindings()
 
         return True
         
@@ -797,11 +1204,13 @@ class PL0Parser():
         ident = str(self.lexer.morphem.value)
         
         if self.nameList.isLocalIdentName(ident):
-            logging.error("[Parser] Can't create Const-Ident: Ident {} already existing.".format(ident))
+            self.error("Can't create Const-Ident: Ident {} already existing.".format(ident))
 
             # Error-Handling  
             return False
 
+        # The procedure gets bound in the enclosing scope
+        self.invalidateBindings()
         self.nameList.createProc(ident)
         return True
     
@@ -811,13 +1220,14 @@ class PL0Parser():
 
         # Create Constant, print error if locally existing
         if self.nameList.isLocalIdentName(ident):
-            logging.error("[Parser] Can't create Procedure-Parameter-Ident: Ident {} already existing.".format(ident))
+            self.error("Can't create Procedure-Parameter-Ident: Ident {} already existing.".format(ident))
 
             # Error-Handling  
             return False
 
         # Add Variable to our namelist
         self.nameList.createProcedureParam(name=ident)
+        self.invalidateBindings()
 
         return True
 
@@ -826,6 +1236,7 @@ class PL0Parser():
         # otherwise the first one gets the highest address and
         # is used as last parameter
         self.nameList.correctParameterList()
+        self.invalidateBindings()
 
         return True
 
@@ -898,38 +1309,27 @@ class PL0Parser():
         identName = self.currentIdent
 
         # Search globally for ident
-        ident = self.nameList.searchIdentNameGlobal(identName)
+        binding = self.bindIdent(identName)
 
         # if ident not found -> Semantic Error!
-        if ident is None:
-            logging.error("[Parser] Declaration error: Var {} is used in assignment but not declared.".format(identName))
+        if binding is None:
+            self.error("Declaration error: Var {} is used in assignment but not declared.".format(identName))
             return False
 
+        kind, family, args = binding
+
         # Check if const or proc -> Semantic error!
-        if isinstance(ident, NLProc):
-            logging.error("[Parser] Type error: Excepted Variable but got Procedure {} instead".format(identName))
+        if kind is NLProc:
+            self.error("Type error: Excepted Variable but got Procedure {} instead".format(identName))
             return False
 
-        if isinstance(ident, NLConst):
-            logging.error("[Parser] Type error: Excepted Variable but got Constant {} instead".format(identName))
+        if kind is NLConst:
+            self.error("Type error: Excepted Variable but got Constant {} instead".format(identName))
             return False
 
-        # Check if main/local/global variable
-        displacement = ident.addressOffset
-        args = [displacement]
-        if ident.parent == self.nameList.mainProc:
-            # Main Variable
-            if not self.codeGen.writeCommand(VMCode.PUSH_ADDRESS_VAR_MAIN,args):
-                return False
-        elif ident.parent == self.nameList.currentProcedure:
-            # Local Scope Variable
-            if not self.codeGen.writeCommand(VMCode.PUSH_ADDRESS_VAR_LOCAL,args):
-                return False
-        else:
-            # Global scope Variable
-            args.append(ident.parent.index)
-            if not self.codeGen.writeCommand(VMCode.PUSH_ADDRESS_VAR_GLOBAL,args):
-                return False
+        # Push the address of the main/local/global variable
+        if not self.codeGen.writeCommand(self.PUSH_ADDRESS_OPCODES[family],args):
+            return False
 
         return True
 
@@ -942,69 +1342,58 @@ class PL0Parser():
 
     # Also known as ST3
     def statementIfCondition(self):
-        self.codeGen.pushLabel()
-        return self.codeGen.writeCommand(VMCode.JMP_NOT,[0])
+        # Jump behind the statement if the condition is false
+        label = self.codeGen.pushLabel()
+        return self.codeGen.writeJump(VMCode.JMP_NOT,label)
 
     # Also known as ST4
     def statementThenStatement(self):
-        label = self.codeGen.popLabel()
-
-        # Add length of jump command (3 bytes) 
-        label.distance -= 3
-        return self.codeGen.correctJmp(label)
+        return self.codeGen.placeLabel(self.codeGen.popLabel())
 
 
     def statementElseKeyword(self):
         jmpNotLabel = self.codeGen.popLabel()
 
-        # For the current JMP Command
-        self.codeGen.pushLabel()
+        # The THEN statement jumps over the ELSE statement
+        jmpLabel = self.codeGen.pushLabel()
 
-        if not self.codeGen.writeCommand(VMCode.JMP,[0]):
+        if not self.codeGen.writeJump(VMCode.JMP,jmpLabel):
             return False
 
-        # Add length of jump command (3 bytes) 
-        #jmpNotLabel.distance += 3
-        return self.codeGen.correctJmp(jmpNotLabel)
+        # A false condition continues with the ELSE statement
+        return self.codeGen.placeLabel(jmpNotLabel)
 
 
     def statementElseStatement(self):
-        
-        jmpLabel = self.codeGen.popLabel()
-        jmpLabel.distance -= 3
-        return self.codeGen.correctJmp(jmpLabel)
+        return self.codeGen.placeLabel(self.codeGen.popLabel())
 
     # Also known as ST5
     def statementWhileCondition(self):
         # Generate Label for the jump at the
         # end of the loop. The Label has to point
         # to the head
-        self.codeGen.pushLabel()
-        return True
+        return self.codeGen.placeLabel(self.codeGen.pushLabel())
 
     # Also known as ST6
     def statementWhileAfterCondition(self):
-        # Generate Label to save the position of the jump
-        # where we have to replace the address later
-        self.codeGen.pushLabel()
+        # Generate Label for the first command after
+        # the loop, it gets placed at the end
+        label = self.codeGen.pushLabel()
 
         # Generate JumpNot which jumps to the first command
         # after the loop if the condition is false
-        # Use 0 as placeholder for JumpNot
-        return self.codeGen.writeCommand(VMCode.JMP_NOT,[0])
+        return self.codeGen.writeJump(VMCode.JMP_NOT,label)
 
     def statementWhileEnd(self):
         # Add jump pointing to the condition of the current while loop
-        jmpNotRelAddr = self.codeGen.popLabel()
-        conditionRelAddr = self.codeGen.popLabel()
+        jmpNotLabel = self.codeGen.popLabel()
+        conditionLabel = self.codeGen.popLabel()
 
-        # Add jump to the condition, add 3 bytes for the jump command itself
-        args1 = [ -conditionRelAddr.distance -3]
-        if not self.codeGen.writeCommand(VMCode.JMP, args1):
+        if not self.codeGen.writeJump(VMCode.JMP, conditionLabel):
             return False
 
-        # Correct address of the JmpNot of the While-Condition
-        return self.codeGen.correctJmp(label=jmpNotRelAddr)
+        # The JmpNot of the While-Condition continues after the loop
+        return self.codeGen.placeLabel(jmpNotLabel)
 
     # Also known as ST8
     def statementCallBeforeParamsProc(self):
@@ -1017,16 +1406,16 @@ class PL0Parser():
 
         # if ident not found -> Semantic Error!
         if ident is None:
-            logging.error("[Parser] Declaration error: Procedure {} is used in call but not declared.".format(identName))
+            self.error("Declaration error: Procedure {} is used in call but not declared.".format(identName))
             return False
         
         # Check if ident is const or var -> Semantic error!
         if isinstance(ident, NLConst):
-            logging.error("[Parser] Type error: Excepted Procedure but got Constant {} instead".format(identName))
+            self.error("Type error: Excepted Procedure but got Constant {} instead".format(identName))
             return False
 
         if isinstance(ident, NLVar):
-            logging.error("[Parser] Type error: Excepted Procedure but got Variable {} instead".format(identName))
+            self.error("Type error: Excepted Procedure but got Variable {} instead".format(identName))
             return False
 
         # Write Call Command with proc index as first argument
@@ -1054,38 +1443,27 @@ class PL0Parser():
         identName = self.currentIdent
 
         # Search globally for ident
-        ident = self.nameList.searchIdentNameGlobal(identName)
+        binding = self.bindIdent(identName)
 
         # if ident not found -> Semantic Error!
-        if ident is None:
-            logging.error("[Parser] Declaration error: Ident {} is used in assignment but not declared.".format(identName))
+        if binding is None:
+            self.error("Declaration error: Ident {} is used in assignment but not declared.".format(identName))
             return False
 
+        kind, family, args = binding
+
         # Check if const or proc -> Semantic error!
-        if isinstance(ident, NLProc):
-            logging.error("[Parser] Type error: Excepted Var ident but got Procedure ident {}".format(identName))
+        if kind is NLProc:
+            self.error("Type error: Excepted Var ident but got Procedure ident {}".format(identName))
             return False
 
-        if isinstance(ident, NLConst):
-            logging.error("[Parser] Type error: Excepted Var ident but got Const ident {}".format(identName))
+        if kind is NLConst:
+            self.error("Type error: Excepted Var ident but got Const ident {}".format(identName))
             return False
 
-        # Check if main/local/global variable
-        displacement = ident.addressOffset
-        args = [displacement]
-        if ident.parent == self.nameList.mainProc:
-            # Main Variable
-            if not self.codeGen.writeCommand(VMCode.PUSH_ADDRESS_VAR_MAIN,args):
-                return False
-        elif ident.parent == self.nameList.currentProcedure:
-            # Local Scope Variable
-            if not self.codeGen.writeCommand(VMCode.PUSH_ADDRESS_VAR_LOCAL,args):
-                return False
-        else:
-            # Global scope Variable
-            args.append(ident.parent.index)
-            if not self.codeGen.writeCommand(VMCode.PUSH_ADDRESS_VAR_GLOBAL,args):
-                return False
+        # Push the address of the main/local/global variable
+        if not self.codeGen.writeCommand(self.PUSH_ADDRESS_OPCODES[family],args):
+            return False
 
         # Write user-input command
         return self.codeGen.writeCommand(VMCode.GET_VAL)
@@ -1104,46 +1482,34 @@ class PL0Parser():
 
     def arrayPushAddr(self):
         # Search globally for ident
-        ident = self.nameList.searchIdentNameGlobal(self.currentIdent)
+        binding = self.bindIdent(self.currentIdent)
 
         # if ident not found -> Semantic Error!
-        if ident is None:
-            logging.error("[Parser] Declaration error: Ident {} is used in assignment but not declared.".format(self.currentIdent))
+        if binding is None:
+            self.error("Declaration error: Ident {} is used in assignment but not declared.".format(self.currentIdent))
             return False
 
+        kind, family, args = binding
+
         # Check if const or proc -> Semantic error!
-        if isinstance(ident, NLProc):
-            logging.error("[Parser] Type error: Excepted Var ident but got Procedure ident {}".format(self.currentIdent))
+        if kind is NLProc:
+            self.error("Type error: Excepted Var ident but got Procedure ident {}".format(self.currentIdent))
             return False
 
-        if isinstance(ident, NLConst):
-            logging.error("[Parser] Type error: Excepted Var ident but got Const ident {}".format(self.currentIdent))
+        if kind is NLConst:
+            self.error("Type error: Excepted Var ident but got Const ident {}".format(self.currentIdent))
             return False
 
-
-        # Check if main/local/global variable
-        displacement = ident.addressOffset
-        args = [displacement]
-        if ident.parent == self.nameList.mainProc:
-            # Main Variable
-            if not self.codeGen.writeCommand(VMCode.PUSH_ADDRESS_VAR_MAIN,args):
-                return False
-        elif ident.parent == self.nameList.currentProcedure:
-            # Local Scope Variable
-            if not self.codeGen.writeCommand(VMCode.PUSH_ADDRESS_VAR_LOCAL,args):
-                return False
-        else:
-            # Global scope Variable
-            args.append(ident.parent.index)
-            if not self.codeGen.writeCommand(VMCode.PUSH_ADDRESS_VAR_GLOBAL,args):
-                return False
+        # Push the address of the main/local/global variable
+        if not self.codeGen.writeCommand(self.PUSH_ADDRESS_OPCODES[family],args):
+            return False
 
         return True
 
     def arraySetIndex(self):
 
         # Get number from the last read morphem
-        self.currentIndex = int(self.lexer.morphem.value)
+        self.currentIndex = self.lexer.morphem.value
         return True
 
     def arrayCrate(self):
@@ -1276,7 +1642,7 @@ class PL0Parser():
     # Also known as FA1
     def factorPushNumber(self):
         # Get number from the last read morphem
-        value = int(self.lexer.morphem.value)
+        value = self.lexer.morphem.value
 
         # Looking for const with the current value
         const = self.nameList.searchConstByValue(value)
@@ -1296,54 +1662,42 @@ class PL0Parser():
         identName = self.currentIdent     
 
         # Search globally for ident
-        ident = self.nameList.searchIdentNameGlobal(identName)
+        binding = self.bindIdent(identName)
 
         # if ident not found -> Semantic Error!
-        if ident is None:
-            logging.error("[Parser] Declaration error: Ident {} is used but not declared.".format(identName))
+        if binding is None:
+            self.error("Declaration error: Ident {} is used but not declared.".format(identName))
             return False
 
+        kind, family, args = binding
+
         # Check if ident is a procedure
         # If it is one -> Semantic Error!
-        if isinstance(ident, NLProc):
-            logging.error("[Parser] Type error: Excepted Const/Var ident but got Procedure ident {}".format(identName))
+        if kind is NLProc:
+            self.error("Type error: Excepted Const/Var ident but got Procedure ident {}".format(identName))
             return False
 
         # If the ident is a const, it doesn't matter
         # if main/local/global and we can directly
         # push the index onto the stack
-        if isinstance(ident, NLConst):
-            args = [ident.index]
+        if kind is NLConst:
             self.codeGen.writeCommand(VMCode.PUSH_CONST,args)
             return True
 
-
-        # Check if main/local/global variable
-        displacement = ident.addressOffset
-        args = [displacement]
-        if ident.parent == self.nameList.mainProc:
-            # Main Variable
-            return self.codeGen.writeCommand(VMCode.PUSH_VALUE_VAR_MAIN,args)
-        elif ident.parent == self.nameList.currentProcedure:
-            # Local Scope Variable
-            return self.codeGen.writeCommand(VMCode.PUSH_VALUE_VAR_LOCAL,args)
-        else:
-            # Global scope Variable
-            args.append(ident.parent.index)
-            return self.codeGen.writeCommand(VMCode.PUSH_VALUE_VAR_GLOBAL,args)
+        # Push the value of the main/local/global variable
+        return self.codeGen.writeCommand(self.PUSH_VALUE_OPCODES[family],args)
 
 
     # Language Extension
     # Also known as FOR1
     def forBeforeCondition(self):
-        self.codeGen.pushLabel()
-        return True
+        return self.codeGen.placeLabel(self.codeGen.pushLabel())
         
     # Also known as FOR2
     def  forBeforeIncrement(self):
 
-        self.codeGen.pushLabel()
-        if not self.codeGen.writeCommand(VMCode.JMP_NOT,[0]):
+        label = self.codeGen.pushLabel()
+        if not self.codeGen.writeJump(VMCode.JMP_NOT,label):
             return False
 
         self.codeGen.recordCode()
@@ -1360,16 +1714,14 @@ class PL0Parser():
         self.codeGen.popRecordedCode()
         
         # Add jump pointing to the condition of the current while loop
-        jmpNotRelAddr = self.codeGen.popLabel()
-        conditionRelAddr = self.codeGen.popLabel()
+        jmpNotLabel = self.codeGen.popLabel()
+        conditionLabel = self.codeGen.popLabel()
 
-        # Add jump to the condition, add 3 bytes for the jump command itself
-        args1 = [ -conditionRelAddr.distance -3]
-        if not self.codeGen.writeCommand(VMCode.JMP, args1):
+        if not self.codeGen.writeJump(VMCode.JMP, conditionLabel):
             return False
 
-        # Correct address of the JmpNot of the While-Condition
-        return self.codeGen.correctJmp(label=jmpNotRelAddr)
+        # The JmpNot of the For-Condition continues after the loop
+        return self.codeGen.placeLabel(jmpNotLabel)
         
 
     # Logical Expressions
@@ -1442,7 +1794,8 @@ if __name__ == "__main__":
 
     result = parser.parse()
     if not result:
-        logging.error("[main]  Parser failed with Morphem " + str(parser.lexer.morphem))
+        logging.error("[main]  Parser failed with {} error(s)".format(len(parser.diagnostics)))
+        sys.exit(1)
     else:
         xmlFile = inputFilename + ".xml"
         x = xmlwriter.XMLWriter(xmlFile)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unittest
+import contextlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import sys
+sys.path.append("..")
+import cpl0
+from cpl0 import sourceFiles, compileJob, compileBatch, changedSources, watch
+
+
+class TestCPL0(unittest.TestCase):
+
+    def setUp(self):
+        self.testFileFolder = "testfiles"
+
+    def test_sourceFiles(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, "sub"))
+            for name in ("b.pl0", "a.pl0", "notes.txt", os.path.join("sub", "c.pl0")):
+                open(os.path.join(directory, name), "w").close()
+
+            files = sourceFiles([directory, "x.pl0"])
+
+        self.assertEqual([os.path.relpath(f, directory) for f in files[:3]],
+                         ["a.pl0", "b.pl0", os.path.join("sub", "c.pl0")])
+        self.assertEqual(files[3], "x.pl0")
+
+    def test_compileJob(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ("tmin.pl0", "tmin8.pl0"):
+                shutil.copy(os.path.join(self.testFileFolder, name), directory)
+
+            inputFile, errors, duration, hit = compileJob((os.path.join(directory, "tmin.pl0"), "buffered", False, None, None, False))
+            self.assertEqual(errors, [])
+            self.assertTrue(os.path.exists(os.path.join(directory, "tmin.cl0")))
+
+            with self.assertLogs(level="ERROR"):
+                inputFile, errors, duration, hit = compileJob((os.path.join(directory, "tmin8.pl0"), "buffered", False, None, None, False))
+            self.assertEqual(errors, ["6:7: Syntax Error near B", "8:5: Syntax Error near Symbol.END"])
+            self.assertFalse(os.path.exists(os.path.join(directory, "tmin8.cl0")))
+
+            inputFile, errors, duration, hit = compileJob((os.path.join(directory, "missing.pl0"), "buffered", False, None, None, False))
+            self.assertEqual(len(errors), 1)
+
+    def test_compileJobCRLF(self):
+        with tempfile.TemporaryDirectory() as directory:
+            results = []
+            for newline in (b"\n", b"\r\n"):
+                for name in ("tmin8.pl0", "fakultRecursiv.pl0"):
+                    with open(os.path.join(self.testFileFolder, name), "rb") as f:
+                        source = f.read()
+                    with open(os.path.join(directory, name), "wb") as f:
+                        f.write(source.replace(b"\n", newline))
+
+                with self.assertLogs(level="ERROR"):
+                    inputFile, errors, duration, hit = compileJob((os.path.join(directory, "tmin8.pl0"), "buffered", True, None, None, False))
+                compileJob((os.path.join(directory, "fakultRecursiv.pl0"), "buffered", True, None, None, False))
+                with open(os.path.join(directory, "fakultRecursiv.pl0.xml")) as f:
+                    results.append((errors, f.read()))
+
+        self.assertEqual(results[0][0], ["6:7: Syntax Error near B", "8:5: Syntax Error near Symbol.END"])
+        self.assertEqual(results[0], results[1])
+
+    def test_compileBatchBrokenFile(self):
+        # compileBatch silences the log of the compiler for good
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copy(os.path.join(self.testFileFolder, "tmin.pl0"), os.path.join(directory, "a.pl0"))
+            with open(os.path.join(directory, "b.pl0"), "wb") as f:
+                f.write(b"BEGIN ! 1 \xff END.")
+            shutil.copy(os.path.join(self.testFileFolder, "tmin2.pl0"), os.path.join(directory, "c.pl0"))
+
+            for jobs in (1, 2):
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    failed = compileBatch(sourceFiles([directory]), "buffered", False, jobs)
+
+                lines = output.getvalue().splitlines()
+                self.assertEqual(failed, 1)
+                self.assertEqual([line.split()[0] for line in lines if ".pl0" in line], ["OK", "FAIL", "OK"])
+                self.assertIn("UnicodeDecodeError", output.getvalue())
+                self.assertTrue(lines[-1].startswith("3 file(s), 1 failed"))
+                self.assertTrue(os.path.exists(os.path.join(directory, "c.cl0")))
+
+    def test_changedSources(self):
+        with tempfile.TemporaryDirectory() as directory:
+            inputFile = os.path.join(directory, "a.pl0")
+            with open(inputFile, "w") as f:
+                f.write("BEGIN ! 1 END.")
+
+            changed, state = changedSources(directory, {})
+            self.assertEqual(changed, [inputFile])
+
+            changed, state = changedSources(directory, state)
+            self.assertEqual(changed, [])
+
+            with open(inputFile, "w") as f:
+                f.write("BEGIN ! 10 END.")
+            with open(os.path.join(directory, "b.pl0"), "w") as f:
+                f.write("BEGIN ! 2 END.")
+
+            changed, state = changedSources(directory, state)
+            self.assertEqual(changed, [inputFile, os.path.join(directory, "b.pl0")])
+
+    def test_watchBrokenFile(self):
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+        with tempfile.TemporaryDirectory() as directory:
+            inputFile = os.path.join(directory, "a.pl0")
+            saves = [b"BEGIN ! 1 \xff END.", b"BEGIN ! 1 END."]
+
+            # Each poll of watch saves the next version, then stops it
+            def sleep(seconds):
+                if seconds != cpl0.WATCH_INTERVAL:
+                    return
+                if not saves:
+                    raise KeyboardInterrupt
+                with open(inputFile, "wb") as f:
+                    f.write(saves.pop(0))
+
+            output = io.StringIO()
+            with mock.patch.object(cpl0.time, "sleep", sleep), contextlib.redirect_stdout(output):
+                watch(directory, "buffered", False)
+
+            results = [line.split()[0] for line in output.getvalue().splitlines() if line.endswith("a.pl0")]
+            self.assertEqual(results, ["FAIL", "OK"])
+            self.assertTrue(os.path.exists(os.path.join(directory, "a.cl0")))
+
+if __name__ == '__main__':
+    unittest.main()
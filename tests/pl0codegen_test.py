@@ -2,11 +2,12 @@
 # -*- coding: utf-8 -*-
 import unittest
 import os
+import tempfile
 
 import sys
 sys.path.append("..")
-from pl0namelist import NLConst
-from pl0codegen import PL0CodeGen
+from pl0namelist import NLConst, PL0NameList
+from pl0codegen import PL0CodeGen, PL0FoldingCodeGen, PL0PeepholeOptimizer, VMCode, CGInstruction, CGLabel, lowerInstructions
 
 class TestPL0Parser(unittest.TestCase):
 
@@ -34,5 +35,133 @@ class TestPL0Parser(unittest.TestCase):
         self.assertEqual(c.outputBuffer, bytearray([0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15]))
 
 
+    def test_writeCommand(self):
+        c = PL0CodeGen()
+
+        c.writeCommand(VMCode.PUSH_VALUE_VAR_GLOBAL, [-16, 2])
+        c.writeCommand(VMCode.PUSH_ADDRESS_VAR_LOCAL, [40000])
+        c.writeCommand(VMCode.OP_ADD)
+        self.assertEqual(lowerInstructions(c.instructions), bytearray([2, 0xf0, 0xff, 2, 0, 3, 0x40, 0x9c, 12]))
+
+    def test_putString(self):
+        c = PL0CodeGen()
+
+        c.putString("Hi")
+        self.assertEqual(lowerInstructions(c.instructions), bytearray([27, ord("H"), ord("i"), 0]))
+
+    def test_lowerJumps(self):
+        c = PL0CodeGen()
+
+        # WHILE with the increment recorded before the loop body and an
+        # IF jumping to the end of the procedure
+        c.writeCommand(VMCode.ENTRY_PROC, [0, 0, 4])
+        condition = c.pushLabel()
+        c.placeLabel(condition)
+        c.writeCommand(VMCode.PUSH_VALUE_VAR_LOCAL, [0])
+        end = c.pushLabel()
+        c.writeJump(VMCode.JMP_NOT, end)
+        c.recordCode()
+        c.writeCommand(VMCode.POP)
+        c.stopRecordingCode()
+        c.putString("Hi")
+        c.popRecordedCode()
+        c.writeJump(VMCode.JMP, condition)
+        c.placeLabel(c.popLabel())
+        self.assertIs(c.popLabel(), condition)
+
+        c.writeCommand(VMCode.PUSH_VALUE_VAR_LOCAL, [0])
+        c.writeJump(VMCode.JMP_NOT, c.pushLabel())
+        c.writeCommand(VMCode.RET_PROC)
+        c.placeLabel(c.popLabel())
+
+        self.assertTrue(c.setProcedureLength())
+        self.assertEqual(c.instructions, [])
+        self.assertEqual(c.outputBuffer, bytearray([
+            26, 28, 0, 0, 0, 4, 0,
+            0, 0, 0, 25, 8, 0, 27, ord("H"), ord("i"), 0, 28, 24, 0xf2, 0xff,
+            0, 0, 0, 25, 1, 0, 23]))
+
+    def test_writeImageOnClose(self):
+        with tempfile.TemporaryDirectory() as directory:
+            outputFile = os.path.join(directory, "out.cl0")
+            c = PL0CodeGen(outputFile)
+
+            c.writeCommand(VMCode.ENTRY_PROC, [0, 0, 0])
+            c.flushBuffer()
+            c.setTotalCountOfProcedures(1)
+            self.assertFalse(os.path.exists(outputFile))
+
+            c.closeOutputfile()
+            self.assertEqual(os.listdir(directory), ["out.cl0"])
+            with open(outputFile, "rb") as f:
+                self.assertEqual(f.read(), bytes([1, 0, 0, 0, 26, 0, 0, 0, 0, 0, 0]))
+
+            # Same permissions as a file created by open()
+            referenceFile = os.path.join(directory, "reference")
+            open(referenceFile, "w").close()
+            self.assertEqual(os.stat(outputFile).st_mode, os.stat(referenceFile).st_mode)
+
+    def test_foldConstants(self):
+        nameList = PL0NameList()
+        three, four, one, zero = (nameList.createConst(value).index for value in (3, 4, 1, 0))
+        c = PL0FoldingCodeGen(None, nameList)
+
+        # 3 * 4 + 1 becomes the new constant 13
+        for vmcode, args in ((VMCode.PUSH_CONST, [three]), (VMCode.PUSH_CONST, [four]), (VMCode.OP_MULT, []),
+                             (VMCode.PUSH_CONST, [one]), (VMCode.OP_ADD, []), (VMCode.STORE_VAL, [])):
+            c.writeCommand(vmcode, args)
+
+        self.assertEqual(nameList.constantList[-1].value, 13)
+        self.assertEqual(lowerInstructions(c.instructions), bytearray([6, 4, 0, 7]))
+
+        # Division by zero and negative results stay with the VM
+        c.initOutputBuffer()
+        for vmcode, args in ((VMCode.PUSH_CONST, [one]), (VMCode.PUSH_CONST, [zero]), (VMCode.OP_DIV, []),
+                             (VMCode.PUSH_CONST, [one]), (VMCode.VZ_MINUS, [])):
+            c.writeCommand(vmcode, args)
+        c.placeLabel(c.pushLabel())
+
+        self.assertIs(c.instructions[-1], c.labels[-1])
+        self.assertEqual(lowerInstructions(c.instructions), bytearray([6, 2, 0, 6, 3, 0, 15, 6, 2, 0, 10]))
+
+    def test_peephole(self):
+        optimizer = PL0PeepholeOptimizer([NLConst(0,0)])
+        toJmp = CGLabel()
+        overMinus = CGLabel()
+        code = [
+            CGInstruction(VMCode.ENTRY_PROC.value, (22, 0, 4)),
+            CGInstruction(VMCode.PUSH_VALUE_VAR_LOCAL.value, (0,)),
+            CGInstruction(VMCode.JMP_NOT.value, (), toJmp),
+            CGInstruction(VMCode.PUSH_CONST.value, (0,)),
+            CGInstruction(VMCode.OP_ADD.value, ()),
+            toJmp,
+            CGInstruction(VMCode.JMP.value, (), overMinus),
+            CGInstruction(VMCode.VZ_MINUS.value, ()),
+            overMinus,
+            CGInstruction(VMCode.RET_PROC.value, ())]
+
+        # The JMP_NOT ends up jumping to the next command, so only its
+        # POP of the condition stays
+        self.assertEqual(lowerInstructions(optimizer.optimize(code)), bytearray([26, 22, 0, 0, 0, 4, 0, 0, 0, 0, 28, 23]))
+        self.assertEqual((optimizer.savedBytes, optimizer.savedInstructions), (10, 4))
+
+    def test_peepholeLoop(self):
+        optimizer = PL0PeepholeOptimizer([])
+        condition = CGLabel()
+        end = CGLabel()
+        code = [
+            CGInstruction(VMCode.ENTRY_PROC.value, (16, 0, 4)),
+            condition,
+            CGInstruction(VMCode.PUSH_VALUE_VAR_LOCAL.value, (0,)),
+            CGInstruction(VMCode.JMP_NOT.value, (), end),
+            CGInstruction(VMCode.VZ_MINUS.value, ()),
+            CGInstruction(VMCode.VZ_MINUS.value, ()),
+            CGInstruction(VMCode.JMP.value, (), condition),
+            end,
+            CGInstruction(VMCode.RET_PROC.value, ())]
+
+        self.assertEqual(lowerInstructions(optimizer.optimize(code)), bytearray([26, 16, 0, 0, 0, 4, 0, 0, 0, 0, 25, 3, 0, 24, 0xf7, 0xff, 23]))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unittest
+import os
+import time
+import tempfile
+
+import sys
+sys.path.append("..")
+from pl0compiler import compile, compileWithAst, PL0CompileError, PL0CompileCache
+from pl0parser import PL0Parser
+
+
+class TestPL0Compiler(unittest.TestCase):
+
+    def setUp(self):
+        self.testFileFolder = "testfiles"
+
+    def test_sameAsFile(self):
+        inputFile = os.path.join(self.testFileFolder, "fakultRecursiv.pl0")
+        with open(inputFile, "rb") as f:
+            source = f.read()
+
+        with tempfile.TemporaryDirectory() as directory:
+            outputFile = os.path.join(directory, "fakultRecursiv.cl0")
+            self.assertTrue(PL0Parser(inputFile,outputFile,buildTree=False).parse())
+            with open(outputFile, "rb") as f:
+                code = f.read()
+
+        self.assertEqual(compile(source), code)
+        self.assertEqual(compile(source.decode("utf-8")), code)
+        self.assertEqual(compile(source, "regex"), code)
+
+    def test_ast(self):
+        code, xml = compileWithAst("BEGIN ! 1 END.")
+
+        self.assertEqual(code, compile("BEGIN ! 1 END."))
+        self.assertTrue(xml.startswith("<PROGRAM>\n"))
+        self.assertIn("<TERMINAL line='1' col='9'>1</TERMINAL>", xml)
+
+    def test_errors(self):
+        with self.assertLogs(level="ERROR"):
+            with self.assertRaises(PL0CompileError) as context:
+                compile("VAR X;\nBEGIN\n  X := Y;\n  X := * 2\nEND.")
+
+        self.assertEqual([(d.kind, d.lines) for d in context.exception.diagnostics],
+                         [("semantic", 3), ("syntax", 4)])
+
+    def test_invalidChar(self):
+        with self.assertLogs(level="ERROR"):
+            for lexerBackend in ("stream", "buffered", "regex"):
+                with self.assertRaises(PL0CompileError) as context:
+                    compile("VAR X;\nBEGIN\n  X := 1 \u00e9 2\nEND.".encode("utf-8"), lexerBackend)
+
+                self.assertEqual([(d.kind, d.lines, d.cols) for d in context.exception.diagnostics],
+                                 [("syntax", 3, 10)])
+
+    def test_crlfLines(self):
+        source = b"VAR X;\r\nBEGIN\r\n  X := Y;\r\n  ! X\r\nEND.\r\n"
+        lines = []
+
+        with self.assertLogs(level="ERROR"):
+            for program in (source, source.decode("utf-8")):
+                with self.assertRaises(PL0CompileError) as context:
+                    compile(program)
+                lines.append([(d.lines, d.cols) for d in context.exception.diagnostics])
+
+            with tempfile.TemporaryDirectory() as directory:
+                inputFile = os.path.join(directory, "crlf.pl0")
+                with open(inputFile, "wb") as f:
+                    f.write(source)
+                parser = PL0Parser(inputFile, None, buildTree=False)
+                self.assertFalse(parser.parse())
+                lines.append([(d.lines, d.cols) for d in parser.diagnostics])
+
+        self.assertEqual(lines, [[(3, 9)]] * 3)
+
+    def test_optimize(self):
+        source = "CONST A = 6;\nVAR X;\nBEGIN\n  X := A * 7 - 1;\n  IF 1 < 2 THEN ! X\nEND."
+
+        code = compile(source, optimize=True)
+        self.assertLess(len(code), len(compile(source)))
+        self.assertIn(b"\x29\x00\x00\x00", code)
+
+    def test_cache(self):
+        source = "VAR X;\nBEGIN\n  ? X;\n  ! X * X\nEND."
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PL0CompileCache(directory)
+
+            code = compile(source, cache=cache)
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+            self.assertEqual(compile(source.encode("utf-8"), cache=cache), code)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+            # Options are part of the key
+            self.assertEqual(compileWithAst(source, cache=cache), compileWithAst(source))
+            self.assertEqual(compileWithAst(source, cache=PL0CompileCache(directory)), compileWithAst(source))
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+            # Broken entries count as miss
+            key = cache.key(source, ("buffered", False, False))
+            with open(cache.path(key), "wb") as f:
+                f.write(b"\xff\xff")
+            self.assertEqual(compile(source, cache=cache), code)
+            self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+            # Only entries end up in the directory
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+            # Entries get the permissions of a file created by open(), so
+            # other users sharing the folder can read them
+            referenceFile = os.path.join(directory, "reference")
+            open(referenceFile, "w").close()
+            self.assertEqual(os.stat(cache.path(key)).st_mode, os.stat(referenceFile).st_mode)
+
+            # Entries which can't be read count as miss
+            os.mkdir(cache.path("unreadable"))
+            self.assertIsNone(cache.load("unreadable"))
+            self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+    def test_cacheEviction(self):
+        sources = ["BEGIN ! {} END.".format(i) for i in range(3)]
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PL0CompileCache(directory)
+            for source in sources:
+                compile(source, cache=cache)
+            entrySize = cache.size // 3
+
+            # The least recently used entry goes first
+            past = time.time() - 100
+            for age, source in enumerate(sources):
+                os.utime(cache.path(cache.key(source, ("buffered", False, False))), (past + age, past + age))
+            compile(sources[0], cache=cache)
+
+            cache = PL0CompileCache(directory, maxSize=entrySize * 3 - 1)
+            self.assertEqual(cache.evictions, 1)
+            self.assertFalse(os.path.exists(cache.path(cache.key(sources[1], ("buffered", False, False)))))
+            self.assertLessEqual(cache.size, cache.maxSize)
+
+    def test_cacheLowWater(self):
+        sources = ["BEGIN ! {} END.".format(i) for i in range(10, 22)]
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PL0CompileCache(directory)
+            compile(sources[0], cache=cache)
+            entrySize = cache.size
+
+            # The eleventh entry overflows the cache, eviction makes room
+            # for more than just this one
+            cache = PL0CompileCache(directory, maxSize=entrySize * 10)
+            for source in sources[1:11]:
+                compile(source, cache=cache)
+            self.assertEqual(cache.evictions, 2)
+            self.assertLessEqual(cache.size, cache.maxSize * PL0CompileCache.LOW_WATER)
+
+            compile(sources[11], cache=cache)
+            self.assertEqual(cache.evictions, 2)
+            self.assertEqual(len(os.listdir(directory)), 10)
+
+if __name__ == '__main__':
+    unittest.main()
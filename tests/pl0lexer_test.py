@@ -2,16 +2,18 @@
 # -*- coding: utf-8 -*-
 import unittest
 import os
+import io
 
 import sys
 sys.path.append("..")
 
-from pl0lexer import PL0Lexer, Morphem, MorphemCode, Symbol
+from pl0lexer import PL0Lexer, PL0BufferedLexer, PL0RegexLexer, PL0TokenArray, Morphem, MorphemCode, Symbol
 
 class TestPL0Lexer(unittest.TestCase):
 
     def setUp(self):
         self.testFileFolder = "testfiles"
+        self.exampleFolder = os.path.join("..", "examples")
 
     def test_operator(self):
         testFile = os.path.join(self.testFileFolder, "test1.txt")
@@ -145,6 +147,53 @@ class TestPL0Lexer(unittest.TestCase):
                 Symbol.END, "."
             ])
 
+    def test_numberRange(self):
+        testFile = os.path.join(self.testFileFolder, "numberrange.pl0")
+
+        for lexerClass in (PL0Lexer, PL0BufferedLexer, PL0RegexLexer):
+            lexer = lexerClass(testFile)
+
+            morpheme = []
+            currentMorphem = lexer.lex()
+            while currentMorphem.code != MorphemCode.EMPTY:
+                morpheme.append((currentMorphem.code, currentMorphem.value))
+                currentMorphem = lexer.lex()
+
+            self.assertEqual(morpheme[3], (MorphemCode.NUMBER, 4294967295))
+            self.assertIs(type(morpheme[3][1]), int)
+            self.assertEqual(morpheme[7], (MorphemCode.INVALID, "4294967296"))
+
+    def test_iter(self):
+        testFile = os.path.join(self.testFileFolder, "tx.pl0")
+        expected = [(m.code, m.value, m.lines, m.cols) for m in PL0Lexer(testFile)]
+
+        with open(testFile, "rb") as f:
+            source = f.read()
+
+        for lexerClass in (PL0Lexer, PL0BufferedLexer, PL0RegexLexer):
+            for inputFile in (testFile, source, io.StringIO(source.decode())):
+                morpheme = [(m.code, m.value, m.lines, m.cols) for m in lexerClass.iter(inputFile)]
+                self.assertEqual(morpheme, expected)
+
+    def test_iterStreamStaysOpen(self):
+        stream = io.StringIO("! 5.")
+        self.assertEqual([m.value for m in PL0Lexer.iter(stream)], ["!", 5, "."])
+        self.assertFalse(stream.closed)
+
+    def test_closeSource(self):
+        testFile = os.path.join(self.testFileFolder, "tx.pl0")
+
+        # The source gets closed at EOF, not when the lexer is collected
+        lexer = PL0Lexer(testFile)
+        sourceFile = lexer.sourceFile
+        list(lexer)
+        self.assertTrue(sourceFile.closed)
+
+        with PL0Lexer(testFile) as lexer:
+            sourceFile = lexer.sourceFile
+            lexer.lex()
+        self.assertTrue(sourceFile.closed)
+
     def test_lines(self):
         testFile = os.path.join(self.testFileFolder, "tx.pl0")
         lexer = PL0Lexer(testFile)
@@ -171,5 +220,74 @@ class TestPL0Lexer(unittest.TestCase):
                              (11,3),(11,6),
                              (13,1), (13,6), (13,8)
                          ])
+
+    def assertSameMorphems(self, lexerClass):
+        # Every lexer backend has to deliver the same morphemes
+        # at the same positions as the char by char lexer
+        testFiles = [os.path.join(self.testFileFolder, fileName) for fileName in sorted(os.listdir(self.testFileFolder))]
+        testFiles += [os.path.join(self.exampleFolder, fileName) for fileName in sorted(os.listdir(self.exampleFolder))]
+
+        for testFile in testFiles:
+            lexer = PL0Lexer(testFile)
+            otherLexer = lexerClass(testFile)
+
+            while True:
+                currentMorphem = lexer.lex()
+                otherMorphem = otherLexer.lex()
+
+                self.assertEqual(
+                    (otherMorphem.code, otherMorphem.value, otherMorphem.lines, otherMorphem.cols),
+                    (currentMorphem.code, currentMorphem.value, currentMorphem.lines, currentMorphem.cols),
+                    testFile)
+
+                if currentMorphem.code == MorphemCode.EMPTY:
+                    break
+
+    def test_bufferedLexer(self):
+        self.assertSameMorphems(PL0BufferedLexer)
+
+    def test_regexLexer(self):
+        self.assertSameMorphems(PL0RegexLexer)
+
+    def test_tokenArray(self):
+        testFile = os.path.join(self.testFileFolder, "tx.pl0")
+        lexer = PL0Lexer(testFile)
+        tokens = PL0BufferedLexer(testFile).tokenArray()
+
+        self.assertIsInstance(tokens, PL0TokenArray)
+        for index in range(len(tokens)):
+            morphem = lexer.lex()
+            token = tokens[index]
+            self.assertEqual(
+                (token.code, token.value, token.lines, token.cols),
+                (morphem.code, morphem.value, morphem.lines, morphem.cols))
+
+        self.assertEqual(lexer.lex().code, MorphemCode.EMPTY)
+        with self.assertRaises(IndexError):
+            tokens[len(tokens)]
+
+    def test_invalidChars(self):
+        # Chars outside the char vector end the token in front of them or
+        # break off a comment/string, then they become invalid morphems
+        source = 'X := A\u00e4 /* \u00e9 */;\n! "\u20ac"'.encode("utf-8")
+        expected = [(MorphemCode.IDENT, "X", 1, 1), (MorphemCode.SYMBOL, Symbol.ASSIGN, 1, 3),
+                    (MorphemCode.IDENT, "A", 1, 6), (MorphemCode.INVALID, "\u00e4", 1, 7),
+                    (MorphemCode.INVALID, "\u00e9", 1, 12), (MorphemCode.SYMBOL, "*", 1, 14),
+                    (MorphemCode.SYMBOL, "/", 1, 15), (MorphemCode.SYMBOL, ";", 1, 16),
+                    (MorphemCode.SYMBOL, "!", 2, 1), (MorphemCode.INVALID, "\u20ac", 2, 4)]
+
+        with self.assertLogs(level="ERROR"):
+            for lexerClass in (PL0Lexer, PL0BufferedLexer, PL0RegexLexer):
+                self.assertEqual([(m.code, m.value, m.lines, m.cols) for m in lexerClass(source)], expected)
+
+    def test_tokenArrayNegativeColumn(self):
+        # The token after a string spanning lines gets a negative column
+        source = b'BEGIN\n ! "ab\ncdefgh" ; X := 1\nEND.\n'
+        morphems = [(m.code, m.value, m.lines, m.cols) for m in PL0BufferedLexer(source)]
+        tokens = PL0BufferedLexer(source).tokenArray()
+
+        self.assertIn(-1, [cols for _, _, _, cols in morphems])
+        self.assertEqual([(t.code, t.value, t.lines, t.cols) for t in (tokens[i] for i in range(len(tokens)))], morphems)
+
 if __name__ == '__main__':
     unittest.main()
@@ -59,6 +59,32 @@ class TestPL0Parser(unittest.TestCase):
         const2 = nameList.createConst(value=1337)
         self.assertEqual(const2, const1)
 
+    def test_constPoolIndex(self):
+        nameList = PL0NameList()
+
+        const1 = nameList.createConst(value=7)
+        const2 = nameList.createConst(value=8)
+        named = nameList.createConst(name="c", value=7)
+
+        self.assertEqual((const1.index, const2.index), (0, 1))
+        self.assertEqual(named.index, 0)
+        self.assertEqual(named.name, "c")
+        self.assertEqual(len(nameList.constantList), 2)
+        self.assertIs(nameList.searchConstByValue(8), const2)
+        self.assertIsNone(nameList.searchConstByValue(9))
+
+    def test_namedConstInConstants(self):
+        nameList = PL0NameList()
+
+        named = nameList.createConst(name="c", value=3)
+        proc = nameList.mainProc()
+
+        self.assertEqual(proc.constants, [named])
+        self.assertEqual(proc.childProcedures, [])
+        self.assertIs(nameList.searchIdentNameLocal("c"), named)
+        with self.assertRaises(AttributeError):
+            named.unknown = 1
+
     # Variable Tests
     def test_addVar(self):
         nameList = PL0NameList()
@@ -243,5 +269,23 @@ class TestPL0Parser(unittest.TestCase):
 
         const3 = n.searchIdentNameGlobal(procedure=proc5,name=name)
         self.assertEqual(const1,const3)
+
+    def test_searchShadowedIdent(self):
+        n = PL0NameList()
+
+        globalVar = n.createVar("x")
+        proc1 = n.createProc("p1")
+        localVar = n.createVar("x")
+        proc2 = n.createProc("p2")
+
+        # Local beats global, the nearest enclosing scope wins
+        self.assertIs(n.searchIdentNameGlobal(procedure=proc1, name="x"), localVar)
+        self.assertIs(n.searchIdentNameGlobal(procedure=proc2, name="x"), localVar)
+        self.assertIs(n.searchIdentNameGlobal(procedure=n.mainProc(), name="x"), globalVar)
+
+        # A procedure's own name resolves to itself
+        self.assertIs(n.searchIdentNameLocal(procedure=proc2, name="p2"), proc2)
+        self.assertIs(n.searchIdentNameGlobal(procedure=proc2, name="p1"), proc1)
+        self.assertIsNone(n.searchIdentNameGlobal(procedure=proc2, name="y"))
 if __name__ == '__main__':
     unittest.main()
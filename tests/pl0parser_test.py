@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import unittest
+import io
 import os
+import tempfile
 
 import sys
 sys.path.append("..")
-from pl0parser import PL0Parser, EdgeType, Edge
-from pl0lexer import Symbol
+from pl0parser import PL0Parser, EdgeType, Edge, NonTerminal
+from pl0lexer import Symbol, MorphemCode
+from pl0namelist import NLVar
 
 
 class TestPL0Parser(unittest.TestCase):
@@ -22,6 +25,128 @@ class TestPL0Parser(unittest.TestCase):
 
         self.assertIsInstance(p, PL0Parser)
 
+    def test_sharedSyntaxTables(self):
+        inputFile = os.path.join(self.testFileFolder, "tx.pl0")
+
+        p1 = PL0Parser(inputFile,None)
+        p2 = PL0Parser(inputFile,None)
+        tables = p1.syntaxTables
+
+        self.assertIs(tables, p2.syntaxTables)
+
+        # The program graph starts at edge 0 with its BLOCK subgraph
+        self.assertEqual(tables.types[0], EdgeType.SUBGRAPH_.value)
+        self.assertEqual(tables.names[tables.values[0]], "BLOCK")
+        self.assertEqual(len(tables.types), len(tables.next))
+        self.assertEqual(len(tables.types), len(tables.alternative))
+
+    def test_firstSets(self):
+        inputFile = os.path.join(self.testFileFolder, "tx.pl0")
+
+        # The code stays in memory, nothing gets written to testfiles
+        p = PL0Parser(inputFile,None)
+        tables = p.syntaxTables
+
+        symbols, codes = tables.first[tables.start[NonTerminal.STATEMENT]]
+        self.assertEqual(symbols, {Symbol.BEGIN, Symbol.CALL, Symbol.FOR, Symbol.IF,
+                                   Symbol.RETURN, Symbol.WHILE, '!', '?'})
+        self.assertEqual(codes, {MorphemCode.IDENT})
+
+        # Blocks can start with the statement's NIL edge
+        self.assertIsNone(tables.first[tables.start[NonTerminal.BLOCK]])
+
+        self.assertTrue(p.parse())
+        self.assertGreater(p.subgraphsSkipped, 0)
+
+    def test_withoutTree(self):
+        inputFile = os.path.join(self.testFileFolder, "fakultRecursiv.pl0")
+
+        with tempfile.TemporaryDirectory() as directory:
+            code = []
+            for buildTree in (True, False):
+                outputFile = os.path.join(directory, "out{}.cl0".format(int(buildTree)))
+                result = PL0Parser(inputFile,outputFile,buildTree=buildTree).parse()
+                with open(outputFile, "rb") as f:
+                    code.append(f.read())
+
+            self.assertIs(result, True)
+            self.assertEqual(code[0], code[1])
+
+    def test_deepNesting(self):
+        # Nesting far beyond the recursion limit must not overflow the stack
+        depth = sys.getrecursionlimit() * 2
+        source = "VAR X;\nBEGIN\n X := {}1{};\n {}! X\nEND.\n".format(
+            "(" * depth, ")" * depth, "IF X = 1 THEN " * 200)
+
+        with tempfile.TemporaryDirectory() as directory:
+            inputFile = os.path.join(directory, "deep.pl0")
+            outputFile = os.path.join(directory, "deep.cl0")
+            with open(inputFile, "w") as f:
+                f.write(source)
+
+            result = PL0Parser(inputFile,outputFile).parse()
+
+        self.assertTrue(result)
+        self.assertEqual(result[0].value, "PROGRAM")
+
+
+    def test_multipleErrors(self):
+        source = "\n".join([
+            "VAR X, Y;",
+            "BEGIN",
+            "  X := * 2;",
+            "  Y := Z;",
+            "  IF X = THEN Y := 1;",
+            "  ! X",
+            "END."])
+
+        with tempfile.TemporaryDirectory() as directory:
+            inputFile = os.path.join(directory, "errors.pl0")
+            outputFile = os.path.join(directory, "errors.cl0")
+            with open(inputFile, "w") as f:
+                f.write(source)
+
+            # Recovering works the same with and without parse tree
+            for buildTree in (True, False):
+                p = PL0Parser(inputFile,outputFile,buildTree=buildTree)
+                with self.assertLogs(level="ERROR"):
+                    self.assertIs(p.parse(), False)
+
+                self.assertEqual([(d.kind, d.lines, d.cols) for d in p.diagnostics],
+                                 [("syntax", 3, 8), ("semantic", 4, 9), ("syntax", 5, 10)])
+                self.assertEqual(str(p.diagnostics[1]), "4:9: Declaration error: Ident Z is used but not declared.")
+
+            # Failed compilations don't write any output
+            self.assertFalse(os.path.exists(outputFile))
+
+    def test_errorInProcedure(self):
+        inputFile = os.path.join(self.testFileFolder, "tmin8.pl0")
+
+        with tempfile.TemporaryDirectory() as directory:
+            outputFile = os.path.join(directory, "tmin8.cl0")
+            p = PL0Parser(inputFile,outputFile)
+            with self.assertLogs(level="ERROR"):
+                self.assertIs(p.parse(), False)
+
+            # Failed compilations leave no output behind
+            self.assertEqual(os.listdir(directory), [])
+
+        self.assertEqual([(d.lines, d.cols) for d in p.diagnostics], [(6, 7), (8, 5)])
+
+    def test_bindingCache(self):
+        p = PL0Parser(io.StringIO("VAR X;\nPROCEDURE P;\nVAR Y;\nY := X + Y;\nX := 1.\n"))
+        self.assertTrue(p.parse())
+
+        main, procedure = p.nameList.procedures
+        self.assertEqual(main.bindings, {"X": (NLVar, PL0Parser.VAR_LOCAL, (0,))})
+        self.assertEqual(procedure.bindings, {
+            "X": (NLVar, PL0Parser.VAR_GLOBAL, (0, 0)),
+            "Y": (NLVar, PL0Parser.VAR_LOCAL, (0,))})
+
+        # A new declaration drops the bindings of its scope
+        p.nameList.currentProcedure = procedure
+        p.invalidateBindings()
+        self.assertEqual(procedure.bindings, {})
 
 if __name__ == '__main__':
     unittest.main()
@@ -24,14 +24,30 @@ class XMLWriter:
 
     def parse(self, tree, depth=0):
 
-        out = ""
-        for el in tree:
-            if el['type'].value == pl0parser.EdgeType.SUBGRAPH_.value:
-                out += ("  " * depth) + "<{}>\n".format(el['value'])
-                out += self.parse(el['sub'], depth+1)
-                out += ("  " * depth) + "</{}>\n".format(el['value'])
+        # Walks the tree with an explicit stack instead of recursion, so
+        # deeply nested trees don't hit the recursion limit. The stack holds
+        # (elements, index, depth) of the pending siblings and the closing
+        # tags of the open subgraphs.
+        out = []
+        stack = [(tree, 0, depth)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                out.append(item)
+                continue
+
+            elements, index, depth = item
+            if index == len(elements):
+                continue
+            stack.append((elements, index + 1, depth))
+
+            el = elements[index]
+            if el.type.value == pl0parser.EdgeType.SUBGRAPH_.value:
+                out.append(("  " * depth) + "<{}>\n".format(el.value))
+                stack.append(("  " * depth) + "</{}>\n".format(el.value))
+                stack.append((el.sub, 0, depth + 1))
             else:
-                value = str(el['value'])
+                value = str(el.value)
                 if value == '<':
                     value = "&lt;"
                 elif value == '>':
@@ -42,6 +58,6 @@ class XMLWriter:
                     value = "&apos;"
                 elif value == "&":
                     value = "&amp;"
-                out += ("  " * depth) +  "<TERMINAL line='{}' col='{}'>{}</TERMINAL>\n".format(el['pos'][0],el['pos'][1],value)
+                out.append(("  " * depth) +  "<TERMINAL line='{}' col='{}'>{}</TERMINAL>\n".format(el.lines,el.cols,value))
 
-        return out
+        return "".join(out)